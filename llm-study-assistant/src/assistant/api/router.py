@@ -1,16 +1,23 @@
 import os
 import shutil
 import uuid
-from typing import List
+import json
+from contextlib import closing
+from typing import List, Optional
 from datetime import datetime
 
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
 # Import from the new structured packages
 from ..services.rag import RAGPipeline
 from ..services.obs import OBSController
 from ..services.parsers import get_supported_extensions
+from ..services.model_registry import registry
+from ..services.ocr_pipeline import get_ocr_pipeline
+from ..services.jobs import JOB_STATUSES, JobContext, JobQueue
+from ..services.question_bank import parse_question_file
+from ..services.health import HealthMonitor
 from .schemas import (
     UploadResp, AskRequest, AskResponse, SourceChunk,
     RecordingRequest, RecordingResponse, OBSConnectionStatus
@@ -33,25 +40,111 @@ DATA_DIR = os.getenv("DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
 UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
 RECORDING_DIR = os.getenv("RECORDING_OUTPUT_DIR", os.path.join(DATA_DIR, "recordings"))
 
+JOB_STAGING_DIR = os.path.join(UPLOAD_DIR, ".jobs")
+QUESTION_BANK_DB = os.getenv("QUESTION_BANK_DB", os.path.join(DATA_DIR, "question_bank.db"))
+
 # 确保所有必需的目录都存在
-for directory in [DATA_DIR, UPLOAD_DIR, RECORDING_DIR]:
+for directory in [DATA_DIR, UPLOAD_DIR, RECORDING_DIR, JOB_STAGING_DIR]:
     os.makedirs(directory, exist_ok=True)
 
+
+# --- Background jobs ---
+
+def _run_analyze_job(params: dict, ctx: JobContext) -> dict:
+    file_path = os.path.join(RECORDING_DIR, params["filename"])
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Recording not found: {params['filename']}")
+
+    raw_answers, all_contexts, state = [], [], {}
+    with closing(rag_pipeline.analyze_video_stream(file_path, roi_profile=params.get("profile"))) as events:
+        for event in events:
+            kind = event.pop("event")
+            if kind == "error":
+                raise RuntimeError(event["message"])
+            if kind == "progress":
+                state.update(event)
+            elif kind == "answer":
+                all_contexts.extend(event.pop("contexts"))
+                event.pop("index")
+                raw_answers.append(event)
+            else:
+                continue
+            ctx.progress({**state, "questions_answered": len(raw_answers)})
+
+    return {"raw": {"video_analysis_results": raw_answers}, "contexts": all_contexts}
+
+
+def _discard_staged_upload(params: dict):
+    for item in params["files"]:
+        if os.path.exists(item["path"]):
+            os.remove(item["path"])
+    shutil.rmtree(params["staging_dir"], ignore_errors=True)
+
+
+def _run_upload_job(params: dict, ctx: JobContext) -> dict:
+    try:
+        return rag_pipeline.add_staged_files(params["files"], UPLOAD_DIR, progress=ctx.progress)
+    finally:
+        _discard_staged_upload(params)
+
+
+job_queue = JobQueue(QUESTION_BANK_DB)
+job_queue.register("analyze", _run_analyze_job, concurrency=int(os.getenv("JOB_CONCURRENCY_ANALYZE", "1")))
+job_queue.register("upload", _run_upload_job, concurrency=int(os.getenv("JOB_CONCURRENCY_UPLOAD", "1")),
+                   on_discard=_discard_staged_upload)
+
+# --- Dependency health checks ---
+# The LLM and OBS are probed in the background; status routes only read the cached results.
+
+def _probe_obs() -> dict:
+    status = obs_controller.get_connection_status()
+    return {"ok": status.connected, **status.dict()}
+
+
+health_monitor = HealthMonitor()
+health_monitor.register("llm", lambda: rag_pipeline.llm.ping())
+health_monitor.register("obs", _probe_obs)
+
 # ============ System & Health Routes ============
 
-@router.get("/health")
-def health():
+def _health(checks: dict) -> dict:
+    models = registry.snapshot()
     return {
         "ok": True,
+        "ready": models["ready"],
         "timestamp": datetime.now().isoformat(),
-        "status": rag_pipeline.get_status()
+        "status": rag_pipeline.get_status(),
+        "models": models,
+        "ocr": get_ocr_pipeline().status(),
+        "checks": checks
     }
 
+@router.get("/health")
+def health():
+    """Cached health state; never contacts the LLM or OBS."""
+    return _health(health_monitor.snapshot())
+
+@router.get("/health/deep")
+def deep_health():
+    """Probe every dependency now and return the fresh results."""
+    return _health(health_monitor.check_now())
+
+@router.post("/warmup")
+def warmup():
+    """Start loading the models in the background; poll /health for readiness."""
+    rag_pipeline.warm_up()
+    return registry.snapshot()
+
 @router.get("/system/status")
 def system_status():
+    obs_check = health_monitor.get("obs")
     return {
         "rag_status": rag_pipeline.get_status(),
-        "obs_status": obs_controller.get_connection_status().dict(),
+        # Last background probe; /obs/status checks the connection live
+        "obs_status": OBSConnectionStatus(
+            connected=bool(obs_check["ok"]), host=obs_check.get("host"), port=obs_check.get("port"),
+            error=obs_check.get("error")
+        ).dict(),
         "supported_extensions": get_supported_extensions(),
         "directories": {
             "data": DATA_DIR,
@@ -63,7 +156,7 @@ def system_status():
 # ============ Document Upload & Management Routes ============
 
 @router.post("/upload", response_model=UploadResp)
-async def upload_files(files: List[UploadFile] = File(...)):
+def upload_files(files: List[UploadFile] = File(...)):
     """Upload documents and add them to the knowledge base."""
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
@@ -85,6 +178,30 @@ def get_knowledge_stats():
     """Get knowledge base statistics."""
     return rag_pipeline.get_knowledge_stats()
 
+@router.get("/knowledge/docs")
+def list_knowledge_docs():
+    """List documents in the knowledge base."""
+    return {"documents": rag_pipeline.list_documents()}
+
+@router.delete("/knowledge/{doc_id}")
+def delete_knowledge_doc(doc_id: str):
+    """Remove a document and its vectors from the knowledge base."""
+    deleted = rag_pipeline.delete_document(doc_id, UPLOAD_DIR)
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+    return {"success": True, "message": f"Deleted document: {doc_id}", "deleted_chunks": deleted}
+
+@router.put("/knowledge/{doc_id}")
+def replace_knowledge_doc(doc_id: str, file: UploadFile = File(...)):
+    """Replace a document with a new version; unchanged chunks keep their vectors."""
+    try:
+        result = rag_pipeline.replace_file(doc_id, file, UPLOAD_DIR)
+        return {"success": True, **result}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Document replacement failed: {str(e)}")
+
 # ============ RAG QA Routes ============
 
 @router.post("/ask", response_model=AskResponse)
@@ -93,19 +210,44 @@ async def ask_question(request: AskRequest):
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
-    result = rag_pipeline.solve(
+    result = await rag_pipeline.asolve(
         qtype=request.type,
         question=request.question,
         options=request.options,
-        top_k=request.top_k
+        top_k=request.top_k,
+        min_score=request.min_score,
+        mode=request.mode,
+        rerank=request.rerank
     )
 
     return AskResponse(
         raw=result["raw"],
         contexts=[SourceChunk(**ctx) for ctx in result["contexts"]],
+        cache=result.get("cache"),
         timestamp=datetime.now()
     )
 
+@router.post("/ask/stream")
+async def ask_question_stream(request: AskRequest):
+    """Ask a question and stream the answer as NDJSON: contexts, token..., then answer (or error)."""
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    async def encode():
+        async for event in rag_pipeline.asolve_stream(
+            qtype=request.type,
+            question=request.question,
+            options=request.options,
+            top_k=request.top_k,
+            min_score=request.min_score,
+            mode=request.mode,
+            rerank=request.rerank
+        ):
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(encode(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ============ OBS Recording Routes ============
 
 @router.get("/obs/status", response_model=OBSConnectionStatus)
@@ -182,20 +324,23 @@ def delete_recording(filename: str):
         raise HTTPException(status_code=404, detail="File not found or access denied")
     try:
         os.remove(file_path)
+        # 录像停止时记录的场景信息
+        if os.path.exists(file_path + ".json"):
+            os.remove(file_path + ".json")
         return {"success": True, "message": f"Deleted file: {filename}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
 
 @router.post("/recordings/{filename}/analyze", response_model=AskResponse)
-async def analyze_recording(filename: str):
-    """Analyze a recording to extract Q&A and find answers."""
+def analyze_recording(filename: str, profile: Optional[str] = None):
+    """Analyze a recording to extract Q&A and find answers; `profile` selects an OCR ROI profile."""
     file_path = os.path.join(RECORDING_DIR, filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
 
     try:
         # This complex logic should be in the service layer
-        analysis_result = rag_pipeline.analyze_video(file_path)
+        analysis_result = rag_pipeline.analyze_video(file_path, roi_profile=profile)
         
         if analysis_result["status"] == "failed":
             raise HTTPException(status_code=400, detail=analysis_result["message"])
@@ -208,4 +353,128 @@ async def analyze_recording(filename: str):
     except Exception as e:
         import traceback
         print(f"Video analysis error: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"Video analysis failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Video analysis failed: {str(e)}")
+
+
+@router.post("/recordings/{filename}/analyze/stream")
+def analyze_recording_stream(filename: str, profile: Optional[str] = None, format: str = "ndjson"):
+    """Stream analysis events (started, progress, question, answer, done/error) while the recording is processed.
+
+    `format=ndjson` (default) emits one JSON object per line; `format=sse` emits Server-Sent Events.
+    """
+    file_path = os.path.join(RECORDING_DIR, filename)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+
+    def encode():
+        # Sync generator: Starlette iterates it in the threadpool, so OCR and LLM calls don't block the event loop
+        for event in rag_pipeline.analyze_video_stream(file_path, roi_profile=profile):
+            data = json.dumps(event, ensure_ascii=False, default=str)
+            yield f"event: {event['event']}\ndata: {data}\n\n" if format == "sse" else data + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(encode(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ============ Background Job Routes ============
+
+def _job_view(job: dict) -> dict:
+    job["queue_position"] = job_queue.queue_position(job)
+    # Staged file paths are an implementation detail of upload jobs
+    if job["type"] == "upload":
+        job["params"] = {"files": [item["filename"] for item in job["params"]["files"]]}
+    return job
+
+@router.post("/jobs/upload")
+def submit_upload_job(files: List[UploadFile] = File(...)):
+    """Queue documents for indexing; returns the job immediately."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    # The upload is spooled to disk first so the job can be resumed after a restart
+    staging_dir = os.path.join(JOB_STAGING_DIR, uuid.uuid4().hex)
+    staged = rag_pipeline.stage_uploads(files, staging_dir)
+    if not staged:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="No files provided")
+    return _job_view(job_queue.submit("upload", {"files": staged, "staging_dir": staging_dir}))
+
+@router.post("/jobs/analyze/{filename}")
+def submit_analyze_job(filename: str, profile: Optional[str] = None):
+    """Queue a recording for analysis; returns the job immediately."""
+    if not os.path.exists(os.path.join(RECORDING_DIR, filename)):
+        raise HTTPException(status_code=404, detail="File not found")
+    return _job_view(job_queue.submit("analyze", {"filename": filename, "profile": profile}))
+
+@router.get("/jobs")
+def list_jobs(status: Optional[str] = None, type: Optional[str] = None, limit: int = 50):
+    """List jobs, newest first (without results)."""
+    if status and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(JOB_STATUSES)}")
+    return {"jobs": [_job_view(job) for job in job_queue.list(status=status, job_type=type, limit=limit)]}
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Job status, progress and, once finished, its result."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return _job_view(job)
+
+@router.get("/jobs/{job_id}/events")
+def job_events(job_id: str):
+    """Subscribe to a job as Server-Sent Events; the stream ends when the job finishes."""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    def encode():
+        for job in job_queue.watch(job_id):
+            yield f"event: {job['status']}\ndata: {json.dumps(_job_view(job), ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(encode(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Cancel a queued job, or ask a running one to stop at its next progress update."""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return _job_view(job)
+
+
+# ============ Question Bank Routes ============
+
+def _question_bank():
+    if rag_pipeline.question_bank is None:
+        raise HTTPException(status_code=404, detail="Question bank is disabled (QUESTION_BANK_ENABLED=false)")
+    return rag_pipeline.question_bank
+
+@router.post("/question-bank/import")
+def import_question_bank(file: UploadFile = File(...)):
+    """Bulk-import questions with known answers from a .json, .jsonl or .csv file."""
+    bank = _question_bank()
+    try:
+        items = parse_question_file(file.filename or "", file.file.read())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid question file: {str(e)}")
+    result = bank.import_questions(items)
+    if result["errors"] and not (result["inserted"] or result["updated"] or result["skipped"]):
+        raise HTTPException(status_code=422, detail={"message": "No valid questions in file", "errors": result["errors"]})
+    return {"success": True, **result}
+
+@router.get("/question-bank/stats")
+def question_bank_stats():
+    return _question_bank().stats()
+
+@router.get("/question-bank/search")
+def search_question_bank(q: str, limit: int = 20):
+    """Full-text search over stored question texts."""
+    return {"questions": _question_bank().search(q, limit=limit)}
+
+@router.delete("/question-bank/{question_id}")
+def delete_bank_question(question_id: int):
+    if not _question_bank().delete(question_id):
+        raise HTTPException(status_code=404, detail=f"Question not found: {question_id}")
+    return {"success": True, "message": f"Deleted question: {question_id}"}
@@ -6,6 +6,7 @@ class UploadedFileInfo(BaseModel):
     filename: str
     doc_id: str
     chunks: int
+    duplicate: bool = False  # 内容与已有文档完全相同，未重复入库
 
 class UploadResp(BaseModel):
     ok: bool
@@ -14,12 +15,16 @@ class UploadResp(BaseModel):
     message: str = ""
 
 QuestionType = Literal["single_choice","multi_choice","true_false","subjective","auto"]
+SearchMode = Literal["dense","lexical","hybrid"]
 
 class AskRequest(BaseModel):
     type: QuestionType = "auto"
     question: str
     options: Optional[List[str]] = None
     top_k: int = 5
+    min_score: Optional[float] = None  # 余弦相似度下限，低于该值的上下文不进入提示词
+    mode: Optional[SearchMode] = None  # 检索方式，默认取 SEARCH_MODE
+    rerank: Optional[bool] = None  # 是否用交叉编码器重排序，默认取 RERANK_ENABLED
     context: Optional[str] = None
 
 class SourceChunk(BaseModel):
@@ -27,10 +32,12 @@ class SourceChunk(BaseModel):
     chunk_id: int
     text: str
     score: float = 0.0
+    rerank_score: Optional[float] = None
 
 class AskResponse(BaseModel):
     raw: Any
     contexts: List[SourceChunk]
+    cache: Optional[Literal["exact", "semantic", "question_bank"]] = None  # 命中答案缓存或题库时的来源
     timestamp: datetime = Field(default_factory=datetime.now)
 
 # OBS相关模型
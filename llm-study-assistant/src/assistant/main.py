@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from .api.router import router as api_router
+from .api.router import router as api_router, rag_pipeline, job_queue, health_monitor
+from .services.ocr_pipeline import shutdown_ocr_pipeline
+from .services.llm import close_llm_clients
 import os
 
 def create_app() -> FastAPI:
@@ -24,11 +26,19 @@ def create_app() -> FastAPI:
     @app.on_event("startup")
     async def startup_event():
         print("--- 应用启动 ---")
-        # Here you can initialize resources like DB connections, etc.
+        # 模型在后台线程中预热，服务立即开始接收请求；就绪状态见 /api/health
+        if os.getenv("MODEL_WARMUP", "true").lower() == "true":
+            rag_pipeline.warm_up()
+        job_queue.start()
+        health_monitor.start()
 
     @app.on_event("shutdown")
     async def shutdown_event():
         print("--- 应用关闭 ---")
+        health_monitor.stop()
+        job_queue.stop()
+        shutdown_ocr_pipeline()
+        close_llm_clients()
 
     return app
 
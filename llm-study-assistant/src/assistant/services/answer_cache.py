@@ -0,0 +1,156 @@
+import os
+import re
+import copy
+import json
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .embedding_cache import content_hash
+
+
+class _Entry(NamedTuple):
+    scope: str
+    stem: str                 # 规范化的题干，近似层用它排除题意不同的题目
+    vector: Optional[np.ndarray]
+    value: Dict[str, Any]
+    created: float
+
+
+def normalize_question(text: str) -> str:
+    """统一全角/半角、大小写和空白，去掉结尾的问号句号，使仅有格式差异的题目命中同一缓存"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?？。.!！ ")
+
+
+# 题干中出现在差异部分就会改变题意的字：否定词（“是”/“不是”、“正确”/“错误”）和数字
+_MEANINGFUL_CHARS = set("不非没无未否勿别莫错误除") | set("零一二三四五六七八九十百千万两")
+
+
+def only_noise_differs(a: str, b: str) -> bool:
+    """两个规范化题干的差异是否只可能是OCR噪声：差异部分只有标点空白或普通汉字。
+    含有否定词、数字或英文字母（如 TCP/UDP、3/5）的差异会改变题意，不能视为同一题"""
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        for ch in a[i1:i2] + b[j1:j2]:
+            if ch.isspace() or unicodedata.category(ch).startswith("P"):
+                continue
+            if ch in _MEANINGFUL_CHARS or ch.isdigit() or (ch.isascii() and ch.isalnum()):
+                return False
+    return True
+
+
+class AnswerCache:
+    """/api/ask 和视频解题的两级答案缓存（进程内存）。
+
+    - 精确层：键为 规范化题目 + 题型/选项/检索参数（scope）+ 知识库版本；
+    - 近似层：同一 scope 下题目向量的余弦相似度不低于 similarity，且题干的差异只可能是
+      OCR噪声（见 only_noise_differs，“正确的是”/“错误的是”这类差异不算）时视为同一题；
+    条目超过 ttl_seconds 过期，超过 max_entries 时按最近使用淘汰（LRU）。知识库版本
+    （文档的添加、删除、替换）变化后所有条目失效。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 similarity: Optional[float] = None, enabled: Optional[bool] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+        # 0 表示关闭近似层
+        self.similarity = similarity if similarity is not None else float(
+            os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.enabled and self.similarity > 0
+
+    @staticmethod
+    def make_key(question: str, options: Any, qtype: Optional[str], params: Dict[str, Any]) -> Tuple[str, str]:
+        """返回 (精确键, scope)；选项、题型和检索参数不同的题目不会互相命中"""
+        if isinstance(options, list):
+            options = [normalize_question(o) for o in options]
+        elif options:
+            options = normalize_question(str(options))
+        scope = json.dumps({"type": qtype, "options": options or None, **params}, sort_keys=True, ensure_ascii=False)
+        return content_hash(scope + "\n" + normalize_question(question)), scope
+
+    def _sync_version(self, version: int) -> bool:
+        """知识库版本前进时清空缓存；版本落后（解题期间知识库已更新）时返回 False。调用方已持有锁"""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        return True
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created > self.ttl_seconds
+
+    def get(self, key: str, scope: str, stem: str, vector: Optional[np.ndarray],
+            version: int) -> Optional[Tuple[Dict[str, Any], str]]:
+        """返回 (缓存的结果, 命中层级 "exact"/"semantic")，未命中返回 None。stem 为 normalize_question 后的题干"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            if not self._sync_version(version):
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            tier = "exact"
+
+            if entry is None and vector is not None and self.semantic:
+                candidates = [(k, e) for k, e in self._entries.items()
+                              if e.scope == scope and e.vector is not None and e.vector.shape == vector.shape
+                              and not self._expired(e, now)]
+                if candidates:
+                    scores = np.stack([e.vector for _, e in candidates]) @ vector
+                    # 按相似度从高到低，取第一个题意相同的候选
+                    for best in np.argsort(-scores):
+                        if scores[best] < self.similarity:
+                            break
+                        if only_noise_differs(stem, candidates[best][1].stem):
+                            key, entry = candidates[best]
+                            tier = "semantic"
+                            break
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits[tier] += 1
+            return copy.deepcopy(entry.value), tier
+
+    def put(self, key: str, scope: str, stem: str, vector: Optional[np.ndarray], version: int,
+            value: Dict[str, Any]):
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[key] = _Entry(scope, stem, vector, copy.deepcopy(value), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": self.enabled, "entries": len(self._entries), "kb_version": self._version,
+                    "hits": dict(self.hits), "misses": self.misses}
@@ -0,0 +1,55 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+import numpy as np
+
+
+def content_hash(text: str) -> str:
+    """文本内容的 SHA-256，用作去重和缓存的键"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """按 (Embedding模型, 内容哈希) 缓存向量的磁盘缓存。
+
+    重复导入相同的课程资料时，直接从缓存读取向量，不再调用 SentenceTransformer.encode。
+    """
+
+    def __init__(self, db_path: str, model_name: str):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """返回命中缓存的 {哈希: 向量}"""
+        unique = list(dict.fromkeys(hashes))
+        found = {}
+        with self._lock:
+            # SQLite 单条语句的参数数量有限，分批查询
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [self.model_name, *batch],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        rows = [(self.model_name, h, np.asarray(v, dtype="float32").tobytes()) for h, v in vectors.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
@@ -0,0 +1,60 @@
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class FrameChangeGate:
+    """OCR前的廉价预筛：与上一次做过OCR的帧相比画面没有变化时跳过OCR。
+
+    帧被缩小为 width 像素宽的灰度缩略图后逐像素比较，灰度差超过 pixel_threshold 的像素
+    占比达到 changed_ratio 才视为画面变化；默认值在1080p画面中仍能识别单个题号数字的变化，
+    同时缩小时的区域平均可以滤掉压缩噪声。比较对象是上一次OCR的帧而不是上一个采样帧，
+    缓慢的渐变也会在累计到阈值后被识别。max_skip_seconds > 0 时，连续跳过超过该时长会强制OCR一次。
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, width: Optional[int] = None,
+                 pixel_threshold: Optional[int] = None, changed_ratio: Optional[float] = None,
+                 max_skip_seconds: Optional[float] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("VIDEO_GATE_ENABLED", "true").lower() == "true"
+        self.width = width or int(os.getenv("VIDEO_GATE_WIDTH", "320"))
+        self.pixel_threshold = pixel_threshold or int(os.getenv("VIDEO_GATE_PIXEL_THRESHOLD", "25"))
+        self.changed_ratio = changed_ratio if changed_ratio is not None else float(
+            os.getenv("VIDEO_GATE_CHANGED_RATIO", "0.0001"))
+        self.max_skip_seconds = max_skip_seconds if max_skip_seconds is not None else float(
+            os.getenv("VIDEO_GATE_MAX_SKIP_SECONDS", "0"))
+        self._last: Optional[np.ndarray] = None
+        self._last_timestamp = 0.0
+        self.processed = 0
+        self.skipped = 0
+
+    def _thumbnail(self, image: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        height = max(1, round(gray.shape[0] * self.width / gray.shape[1]))
+        return cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    def difference(self, thumb: np.ndarray) -> float:
+        """与上一次OCR帧相比发生变化的像素占比"""
+        if self._last is None or self._last.shape != thumb.shape:
+            return 1.0
+        diff = cv2.absdiff(thumb, self._last)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def should_process(self, image: np.ndarray, timestamp: float = 0.0) -> bool:
+        """返回该帧是否需要OCR；需要时把它记为新的比较基准"""
+        if not self.enabled:
+            self.processed += 1
+            return True
+
+        thumb = self._thumbnail(image)
+        changed = self.difference(thumb) >= self.changed_ratio
+        if not changed and self.max_skip_seconds > 0:
+            changed = timestamp - self._last_timestamp >= self.max_skip_seconds
+        if changed:
+            self._last = thumb
+            self._last_timestamp = timestamp
+            self.processed += 1
+        else:
+            self.skipped += 1
+        return changed
@@ -0,0 +1,181 @@
+import os
+import re
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Iterator, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 采样方式：auto 根据帧间隔和视频能否被 OpenCV 打开自动选择
+SAMPLER_METHODS = ("auto", "grab", "seek", "ffmpeg")
+# 无法读取FPS时假设的帧率
+DEFAULT_FPS = 25.0
+
+_SHOWINFO = re.compile(r"\bn:\s*(\d+)\s+pts:\s*\S+\s+pts_time:\s*([-\d.]+)")
+
+
+class SampledFrame(NamedTuple):
+    index: int          # 在原视频中的帧序号（ffmpeg 方式下按时间戳估算）
+    timestamp: float    # 秒
+    image: np.ndarray   # BGR
+
+
+class FrameSampler:
+    """按固定时间间隔从视频中取帧，解码开销只与采样帧数成正比。
+
+    - grab: 跳过的帧只调用 cap.grab()，不做颜色转换和拷贝，只有采样帧 retrieve；
+    - seek: 直接定位到目标帧（从最近的关键帧开始解码），适合采样间隔远大于关键帧间隔的长录像；
+    - ffmpeg: 只解码关键帧（-skip_frame nokey），再按间隔筛选，用于 OpenCV 无法打开的文件；
+    - auto: 间隔不小于 VIDEO_SEEK_MIN_FRAMES 帧时用 seek，否则用 grab；OpenCV 打不开时用 ffmpeg。
+    """
+
+    def __init__(self, method: Optional[str] = None, seek_min_frames: Optional[int] = None):
+        self.method = (method or os.getenv("VIDEO_SAMPLER", "auto")).lower()
+        if self.method not in SAMPLER_METHODS:
+            logger.warning(f"未知的采样方式 {self.method}，使用 auto。")
+            self.method = "auto"
+        self.seek_min_frames = seek_min_frames or int(os.getenv("VIDEO_SEEK_MIN_FRAMES", "300"))
+        self.ffmpeg = shutil.which(os.getenv("FFMPEG_BIN", "ffmpeg"))
+        self.ffprobe = shutil.which(os.getenv("FFPROBE_BIN", "ffprobe"))
+
+    def frames(self, video_path: str, interval_seconds: float) -> Iterator[SampledFrame]:
+        """按时间顺序返回采样帧"""
+        if self.method == "ffmpeg":
+            yield from self._sample_ffmpeg(video_path, interval_seconds)
+            return
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            cap.release()
+            if self.method == "auto" and self.ffmpeg and self.ffprobe:
+                logger.warning(f"OpenCV无法打开视频，改用ffmpeg关键帧采样: {video_path}")
+                yield from self._sample_ffmpeg(video_path, interval_seconds)
+            else:
+                logger.error(f"无法打开视频文件: {video_path}")
+            return
+
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            if fps <= 0:
+                logger.warning("无法获取视频FPS，将使用默认帧率。")
+                fps = DEFAULT_FPS
+            frame_interval = max(1, int(round(fps * interval_seconds)))
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+
+            method = self.method
+            if method == "auto":
+                method = "seek" if frame_interval >= self.seek_min_frames and total > 0 else "grab"
+            if method == "seek" and total <= 0:
+                method = "grab"
+
+            logger.info(f"帧采样: {method}, FPS: {fps:.2f}, 帧间隔: {frame_interval}, 总帧数: {total}")
+            if method == "seek":
+                yield from self._sample_seek(cap, fps, frame_interval, total)
+            else:
+                yield from self._sample_grab(cap, fps, frame_interval)
+        finally:
+            cap.release()
+
+    @staticmethod
+    def _sample_grab(cap, fps: float, frame_interval: int) -> Iterator[SampledFrame]:
+        index = 0
+        while True:
+            if index % frame_interval == 0:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield SampledFrame(index, index / fps, frame)
+            elif not cap.grab():
+                break
+            index += 1
+
+    @staticmethod
+    def _sample_seek(cap, fps: float, frame_interval: int, total: int) -> Iterator[SampledFrame]:
+        for target in range(0, total, frame_interval):
+            if target and not cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                logger.warning(f"定位到第 {target} 帧失败，停止采样")
+                break
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield SampledFrame(target, target / fps, frame)
+
+    def _probe(self, video_path: str):
+        """用 ffprobe 读取视频的宽、高和平均帧率"""
+        out = subprocess.run(
+            [self.ffprobe, "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "stream=width,height,avg_frame_rate", "-of", "csv=p=0:s=x", video_path],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        width, height, rate = out.splitlines()[0].split("x")[:3]
+        num, _, den = rate.partition("/")
+        fps = float(num) / float(den) if den and float(den) else 0.0
+        return int(width), int(height), fps or DEFAULT_FPS
+
+    def _sample_ffmpeg(self, video_path: str, interval_seconds: float) -> Iterator[SampledFrame]:
+        """只解码关键帧，并保留与上一个输出帧相隔至少 interval_seconds 的关键帧"""
+        if not (self.ffmpeg and self.ffprobe):
+            logger.error("未找到 ffmpeg/ffprobe，无法进行关键帧采样")
+            return
+        try:
+            width, height, fps = self._probe(video_path)
+        except Exception as e:
+            logger.error(f"ffprobe 读取视频信息失败: {e}")
+            return
+
+        select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval_seconds})',showinfo"
+        cmd = [self.ffmpeg, "-hide_banner", "-nostats", "-skip_frame", "nokey", "-i", video_path,
+               "-an", "-vf", select, "-vsync", "vfr", "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        # showinfo 按输出顺序把每帧的时间戳写到 stderr，在后台线程中读取
+        timestamps: "queue.Queue[Optional[float]]" = queue.Queue()
+
+        def read_stderr():
+            for line in iter(proc.stderr.readline, b""):
+                match = _SHOWINFO.search(line.decode("utf-8", "replace"))
+                if match:
+                    timestamps.put(float(match.group(2)))
+            timestamps.put(None)
+
+        reader = threading.Thread(target=read_stderr, name="ffmpeg-showinfo", daemon=True)
+        reader.start()
+
+        frame_size = width * height * 3
+        count = 0
+        stderr_open = True
+        try:
+            while True:
+                data = proc.stdout.read(frame_size)
+                if len(data) < frame_size:
+                    break
+                timestamp = None
+                if stderr_open:
+                    try:
+                        timestamp = timestamps.get(timeout=30)
+                    except queue.Empty:
+                        pass
+                    stderr_open = timestamp is not None
+                if timestamp is None:
+                    # 没有解析到时间戳时按采样间隔估算
+                    timestamp = count * interval_seconds
+                index = int(round(timestamp * fps))
+                image = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+                count += 1
+                yield SampledFrame(index, timestamp, image)
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+            logger.info(f"ffmpeg 关键帧采样完成，共 {count} 帧")
+
+
+def sample_frames(video_path: str, interval_seconds: float, method: Optional[str] = None) -> Iterator[SampledFrame]:
+    """按时间间隔采样视频帧，见 FrameSampler"""
+    return FrameSampler(method).frames(video_path, interval_seconds)
@@ -0,0 +1,77 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """依赖服务（LLM、OBS等）的后台健康检查。
+
+    每个检查项是一个返回 {"ok": bool, ...} 的探测函数，由后台线程每隔 interval 秒执行一次，
+    结果缓存在内存中。状态接口只读取缓存（snapshot），不会因前端轮询而访问LLM或OBS；
+    需要最新状态时调用 check_now 立即探测。
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+        self._probes: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, probe: Callable[[], Dict[str, Any]]):
+        self._probes[name] = probe
+        self._results[name] = {"ok": None, "checked_at": None, "latency_ms": None, "error": "not checked yet"}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check_now()
+            self._stop.wait(self.interval)
+
+    def _probe(self, name: str):
+        start = time.perf_counter()
+        try:
+            result = dict(self._probes[name]())
+            result["ok"] = bool(result.get("ok"))
+        except Exception as e:
+            result = {"ok": False, "error": f"{e.__class__.__name__}: {e}"}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["checked_at"] = datetime.now().isoformat()
+        previous = self._results.get(name, {}).get("ok")
+        if previous is not None and previous != result["ok"]:
+            logger.info(f"健康检查 {name}: {'✓ 恢复' if result['ok'] else '✗ 不可用'}")
+        with self._lock:
+            self._results[name] = result
+
+    def check_now(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """立即探测（默认全部检查项），更新缓存并返回最新状态"""
+        for name in names or list(self._probes):
+            self._probe(name)
+        return self.snapshot()
+
+    def get(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._results[name])
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """缓存的检查结果，不执行任何探测"""
+        with self._lock:
+            return {name: dict(result) for name, result in self._results.items()}
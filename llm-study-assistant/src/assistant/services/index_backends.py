@@ -0,0 +1,190 @@
+import os
+import math
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# 支持的索引类型；auto 会根据向量数量在它们之间自动升级
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+# auto 模式下的升级顺序，只升级不降级，避免在阈值附近来回重建
+_AUTO_RANK = {"flat": 0, "hnsw": 1, "ivf_flat": 1, "ivf_pq": 2}
+
+
+class IndexConfig:
+    """ANN索引配置，全部来自环境变量"""
+
+    def __init__(self):
+        self.index_type = os.getenv("INDEX_TYPE", "auto").lower()
+        # auto 模式的切换阈值
+        self.auto_ivf_threshold = int(os.getenv("INDEX_AUTO_IVF_THRESHOLD", "50000"))
+        self.auto_pq_threshold = int(os.getenv("INDEX_AUTO_PQ_THRESHOLD", "1000000"))
+        # IVF: nlist 为 0 时按 4*sqrt(N) 自动计算；每个聚类中心至少需要 train_points_per_list 个训练样本
+        self.nlist = int(os.getenv("IVF_NLIST", "0"))
+        self.nprobe = int(os.getenv("IVF_NPROBE", "16"))
+        self.train_points_per_list = int(os.getenv("IVF_TRAIN_POINTS_PER_LIST", "39"))
+        self.max_train_points = int(os.getenv("IVF_MAX_TRAIN_POINTS", "200000"))
+        # PQ: 子量化器数量，需要整除向量维度
+        self.pq_m = int(os.getenv("PQ_M", "16"))
+        self.pq_nbits = int(os.getenv("PQ_NBITS", "8"))
+        # HNSW
+        self.hnsw_m = int(os.getenv("HNSW_M", "32"))
+        self.hnsw_ef_construction = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+        self.hnsw_ef_search = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+        if self.index_type != "auto" and self.index_type not in INDEX_TYPES:
+            print(f"✗ 未知的索引类型 {self.index_type}，使用 auto。")
+            self.index_type = "auto"
+
+    def nlist_for(self, ntotal: int) -> int:
+        if self.nlist > 0:
+            return self.nlist
+        return max(16, int(4 * math.sqrt(max(ntotal, 1))))
+
+    def can_train(self, index_type: str, ntotal: int) -> bool:
+        """IVF类索引需要足够的样本训练聚类中心"""
+        if not index_type.startswith("ivf"):
+            return True
+        required = self.nlist_for(ntotal) * self.train_points_per_list
+        if index_type == "ivf_pq":
+            # PQ 的每个子量化器同样需要训练 2^nbits 个中心
+            required = max(required, (1 << self.pq_nbits) * self.train_points_per_list)
+        return ntotal >= required
+
+    def desired_type(self, ntotal: int) -> str:
+        """根据配置和当前向量数量确定目标索引类型；样本不足以训练时暂用 Flat"""
+        if self.index_type == "auto":
+            if ntotal >= self.auto_pq_threshold:
+                wanted = "ivf_pq"
+            elif ntotal >= self.auto_ivf_threshold:
+                wanted = "ivf_flat"
+            else:
+                wanted = "flat"
+        else:
+            wanted = self.index_type
+        return wanted if self.can_train(wanted, ntotal) else "flat"
+
+    def needs_migration(self, current: str, ntotal: int) -> Optional[str]:
+        """返回需要迁移到的索引类型，无需迁移时返回 None"""
+        wanted = self.desired_type(ntotal)
+        if wanted == current:
+            return None
+        if self.index_type == "auto" and _AUTO_RANK[wanted] <= _AUTO_RANK[current]:
+            return None
+        if self.index_type != "auto" and wanted == "flat":
+            # 显式配置的 IVF 索引在样本不足时保持现状，等待足够数据后再训练
+            return None
+        return wanted
+
+
+def base_index(index):
+    """取出 IndexIDMap2 包装下的实际索引"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def has_stable_ids(index) -> bool:
+    """索引是否以稳定的块ID（而非行号）寻址：Flat/HNSW 通过 IndexIDMap2，IVF 通过哈希直接映射"""
+    if isinstance(index, faiss.IndexIDMap2):
+        return True
+    if isinstance(index, faiss.IndexIVF):
+        return index.direct_map.type == faiss.DirectMap.Hashtable
+    return False
+
+
+def index_type_of(index) -> str:
+    """识别一个已加载索引的类型"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def build_index(index_type: str, dim: int, config: IndexConfig, train_vectors: Optional[np.ndarray] = None):
+    """按类型创建内积索引；向量已做L2归一化，内积即余弦相似度。
+
+    所有索引都通过 add_with_ids 以稳定的块ID寻址。IVF 自身支持任意ID和删除，
+    使用哈希直接映射；Flat/HNSW 包装在 IndexIDMap2 中。IVF类索引用 train_vectors 训练聚类中心。
+    """
+    ntotal = 0 if train_vectors is None else len(train_vectors)
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.hnsw_m, metric)
+        index.hnsw.efConstruction = config.hnsw_ef_construction
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = config.nlist_for(ntotal)
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_pq" and dim % config.pq_m == 0:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.pq_m, config.pq_nbits, metric)
+        else:
+            if index_type == "ivf_pq":
+                print(f"✗ PQ_M={config.pq_m} 不能整除向量维度 {dim}，改用 IVF-Flat。")
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        index.train(_training_sample(train_vectors, config.max_train_points))
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        index = faiss.IndexFlatIP(dim)
+
+    configure_search(index, config)
+    if not isinstance(index, faiss.IndexIVF):
+        index = faiss.IndexIDMap2(index)
+    return index
+
+
+def uses_cosine(index) -> bool:
+    """旧版索引使用 L2 距离和未归一化向量，需要迁移"""
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def _training_sample(vectors: np.ndarray, max_points: int) -> np.ndarray:
+    if len(vectors) <= max_points:
+        return vectors
+    rng = np.random.default_rng(0)
+    return vectors[rng.choice(len(vectors), max_points, replace=False)]
+
+
+def configure_search(index, config: IndexConfig):
+    """设置索引的默认召回/延迟参数"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.hnsw_ef_search
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = config.nprobe
+
+
+def search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """为单次查询构造参数，覆盖索引上的默认 nprobe/efSearch"""
+    index = base_index(index)
+    if nprobe and isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search and isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+
+def reconstruct_ids(index, ids: List[int]) -> np.ndarray:
+    """按块ID取出原始向量，用于迁移和重建索引；旧版行号索引的ID即行号"""
+    if not ids:
+        return np.zeros((0, index.d), dtype="float32")
+    if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+        index.make_direct_map()
+    return index.reconstruct_batch(np.array(ids, dtype="int64"))
+
+
+def remove_ids(index, ids: List[int]) -> bool:
+    """从索引中删除向量；HNSW 不支持删除，返回 False，由调用方留作墓碑等待重建"""
+    try:
+        index.remove_ids(np.array(ids, dtype="int64"))
+        return True
+    except RuntimeError:
+        return False
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """任务被取消；由 JobContext.progress 抛出，处理函数无需捕获"""
+
+
+class JobContext:
+    """传给任务处理函数的上下文，用于汇报进度和响应取消"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+
+    @property
+    def cancelled(self) -> bool:
+        return self._queue._cancel_requested(self.job_id)
+
+    def progress(self, data: Dict[str, Any]):
+        """记录进度；任务已被请求取消时抛出 JobCancelled"""
+        self._queue._update(self.job_id, progress=json.dumps(data, ensure_ascii=False, default=str))
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+
+class _JobType:
+    def __init__(self, handler: Callable[[Dict[str, Any], JobContext], Any], concurrency: int,
+                 on_discard: Optional[Callable[[Dict[str, Any]], None]]):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.on_discard = on_discard
+
+
+class JobQueue:
+    """持久化在 SQLite 中的后台任务队列。
+
+    - submit 写入一行 queued 记录后立即返回任务ID，由各任务类型自己的工作线程按提交顺序领取执行，
+      同一类型同时运行的任务数不超过注册时的 concurrency；
+    - 任务参数和结果以 JSON 保存，服务重启后 queued 的任务继续执行，执行到一半的任务重新排队，
+      重试超过 max_attempts 次的标记为失败；
+    - 取消排队中的任务立即生效，运行中的任务在下一次汇报进度时停止。
+    """
+
+    def __init__(self, db_path: str, max_attempts: Optional[int] = None,
+                 retention_days: Optional[float] = None):
+        self.db_path = db_path
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.retention_days = retention_days if retention_days is not None else float(
+            os.getenv("JOB_RETENTION_DAYS", "7"))
+        self._types: Dict[str, _JobType] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        # 任务状态或进度变化时通知等待中的工作线程和订阅者
+        self._changed = threading.Condition()
+        self._stopping = threading.Event()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                progress TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(type, status, created_at);
+            """
+        )
+        self._conn.commit()
+
+    def register(self, job_type: str, handler: Callable[[Dict[str, Any], JobContext], Any],
+                 concurrency: int = 1, on_discard: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """注册任务类型。handler(params, ctx) 的返回值作为任务结果；
+        on_discard(params) 在任务未执行就被取消时调用，用于清理提交时暂存的文件。"""
+        self._types[job_type] = _JobType(handler, concurrency, on_discard)
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._recover()
+        for job_type, spec in self._types.items():
+            for n in range(spec.concurrency):
+                thread = threading.Thread(target=self._worker, args=(job_type,),
+                                          name=f"job-{job_type}-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info("任务队列已启动: " + ", ".join(f"{t} x{s.concurrency}" for t, s in self._types.items()))
+
+    def stop(self, timeout: float = 5.0):
+        """停止领取新任务；运行中的任务被中断后在下次启动时重新执行"""
+        self._stopping.set()
+        with self._changed:
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _recover(self):
+        """把上次退出时仍在运行的任务重新排队，并清理过期的已完成任务"""
+        now = time.time()
+        with self._lock:
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, updated_at = ? "
+                "WHERE status = 'running' AND attempts < ? AND cancel_requested = 0",
+                (now, self.max_attempts)).rowcount
+            failed = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE 'failed' END, "
+                "error = CASE WHEN cancel_requested THEN NULL ELSE 'Interrupted too many times' END, "
+                "finished_at = ?, updated_at = ? WHERE status = 'running'",
+                (now, now)).rowcount
+            if self.retention_days > 0:
+                self._conn.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') "
+                                   "AND finished_at < ?", (now - self.retention_days * 86400,))
+            self._conn.commit()
+        if requeued or failed:
+            logger.info(f"恢复任务队列: {requeued} 个中断的任务重新排队，{failed} 个标记为结束")
+
+    # ---- 提交与查询 ----
+
+    def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if job_type not in self._types:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, type, status, params, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, job_type, json.dumps(params or {}, ensure_ascii=False), now, now))
+            self._conn.commit()
+        self._notify()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, job_type: Optional[str] = None,
+             limit: int = 50) -> List[Dict[str, Any]]:
+        """按提交时间倒序列出任务（不含结果，结果通过 get 获取）"""
+        sql, args = "SELECT * FROM jobs WHERE 1 = 1", []
+        if status:
+            sql += " AND status = ?"
+            args.append(status)
+        if job_type:
+            sql += " AND type = ?"
+            args.append(job_type)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        jobs = [self._to_dict(row) for row in rows]
+        for job in jobs:
+            job.pop("result", None)
+        return jobs
+
+    def queue_position(self, job: Dict[str, Any]) -> Optional[int]:
+        if job["status"] != "queued":
+            return None
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE type = ? AND status = 'queued' AND created_at < ?",
+                (job["type"], job["created_at"])).fetchone()[0]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消任务；已结束的任务保持原状态"""
+        discarded = None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT type, status, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job_type, status, params = row
+            if status == "queued":
+                self._conn.execute("UPDATE jobs SET status = 'cancelled', cancel_requested = 1, "
+                                   "finished_at = ?, updated_at = ? WHERE id = ?", (now, now, job_id))
+                discarded = (job_type, json.loads(params))
+            elif status == "running":
+                self._conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?",
+                                   (now, job_id))
+            self._conn.commit()
+        if discarded:
+            self._discard(*discarded)
+        self._notify()
+        return self.get(job_id)
+
+    def watch(self, job_id: str, heartbeat: float = 15.0) -> Iterator[Dict[str, Any]]:
+        """订阅任务：先返回当前状态，之后每次变化返回一次，任务结束后停止；
+        超过 heartbeat 秒没有变化时重复返回当前状态，便于调用方保持连接。"""
+        last = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            if job["updated_at"] != last:
+                last = job["updated_at"]
+                yield job
+            if job["status"] in FINISHED:
+                return
+            with self._changed:
+                notified = self._changed.wait(timeout=heartbeat)
+            if not notified:
+                last = None
+
+    # ---- 执行 ----
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                               (*fields.values(), job_id))
+            self._conn.commit()
+        self._notify()
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _claim(self, job_type: str) -> Optional[tuple]:
+        """领取该类型最早提交的排队任务"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, params FROM jobs WHERE type = ? AND status = 'queued' "
+                "ORDER BY created_at LIMIT 1", (job_type,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                               "started_at = ?, updated_at = ? WHERE id = ?", (now, now, row[0]))
+            self._conn.commit()
+        self._notify()
+        return row[0], json.loads(row[1])
+
+    def _worker(self, job_type: str):
+        spec = self._types[job_type]
+        while not self._stopping.is_set():
+            claimed = self._claim(job_type)
+            if claimed is None:
+                with self._changed:
+                    self._changed.wait(timeout=1.0)
+                continue
+
+            job_id, params = claimed
+            logger.info(f"开始执行任务 {job_type}/{job_id}")
+            start = time.perf_counter()
+            try:
+                result = spec.handler(params, JobContext(self, job_id))
+                self._update(job_id, status="succeeded", finished_at=time.time(),
+                             result=json.dumps(result, ensure_ascii=False, default=str))
+                logger.info(f"✓ 任务 {job_type}/{job_id} 完成，用时 {time.perf_counter() - start:.1f} 秒")
+            except JobCancelled:
+                self._update(job_id, status="cancelled", finished_at=time.time())
+                logger.info(f"任务 {job_type}/{job_id} 已取消")
+            except Exception as e:
+                logger.exception(f"✗ 任务 {job_type}/{job_id} 失败")
+                self._update(job_id, status="failed", finished_at=time.time(), error=str(e))
+
+    def _discard(self, job_type: str, params: Dict[str, Any]):
+        spec = self._types.get(job_type)
+        if spec and spec.on_discard:
+            try:
+                spec.on_discard(params)
+            except Exception as e:
+                logger.error(f"清理已取消任务失败: {e}")
+
+    def _to_dict(self, row: tuple) -> Dict[str, Any]:
+        (job_id, job_type, status, params, result, error, progress, attempts, cancel_requested,
+         created_at, started_at, finished_at, updated_at) = row
+        return {
+            "id": job_id,
+            "type": job_type,
+            "status": status,
+            "params": json.loads(params),
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "progress": json.loads(progress) if progress else None,
+            "attempts": attempts,
+            "cancel_requested": bool(cancel_requested),
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "updated_at": updated_at,
+        }
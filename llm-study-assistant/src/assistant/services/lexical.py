@@ -0,0 +1,60 @@
+import re
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import jieba
+    jieba.setLogLevel(60)
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+# 分词器编号，记录在元数据库中；分词方式变化时需要重建倒排索引
+TOKENIZER_ID = 2 if JIEBA_AVAILABLE else 1
+
+# 连续的中日韩字符 / 连续的字母数字（产品名、错误码如 0x80070005、VPN）
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_WORD = re.compile(r"[0-9a-z_]+(?:[.\-][0-9a-z_]+)*")
+_TOKEN_CHARS = re.compile(r"\w")
+
+# 查询最多使用的词项数，避免长题干生成过大的 MATCH 表达式
+MAX_QUERY_TOKENS = 64
+
+
+def _bigrams(run: str) -> List[str]:
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text: str) -> List[str]:
+    """BM25 分词：安装了 jieba 时使用搜索引擎模式分词，否则中文按字符二元组切分；
+    英文单词和数字编号保持为整体词项"""
+    text = text.lower()
+    tokens = _WORD.findall(text)
+    if JIEBA_AVAILABLE:
+        for run in _CJK_RUN.findall(text):
+            tokens.extend(t for t in jieba.lcut_for_search(run) if _TOKEN_CHARS.search(t))
+    else:
+        for run in _CJK_RUN.findall(text):
+            tokens.extend(_bigrams(run))
+    return tokens
+
+
+def index_text(text: str) -> str:
+    """写入 FTS5 的文本：词项以空格分隔，由 FTS5 的 unicode61 分词器按空格切回"""
+    return " ".join(tokenize(text))
+
+
+def match_expression(query: str) -> str:
+    """把查询转换为 FTS5 的 OR 查询；每个词项加引号，避免被解析为 FTS5 语法"""
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    return " OR ".join('"{}"'.format(t.replace('"', '""')) for t in terms)
+
+
+def rrf_fuse(rankings: Iterable[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """倒数排名融合(RRF)：score(d) = Σ 1 / (k + rank)，按融合分数从高到低返回 (块ID, 分数)"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
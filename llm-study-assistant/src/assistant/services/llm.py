@@ -1,31 +1,237 @@
 import os
 import json
 import re
+import copy
 import time
+import random
+import asyncio
 import logging
-from openai import OpenAI
-from typing import List, Dict, Any, Union
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+
+import httpx
+from openai import APIStatusError, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from .embedding_cache import content_hash
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class LLMClient:
-    def __init__(self):
-        base = os.getenv("OPENAI_API_BASE", "http://localhost:11434/v1")
-        key = os.getenv("OPENAI_API_KEY", "ollama")
-        self.model = os.getenv("LLM_MODEL", "qwen2.5:3b")
+T = TypeVar("T")
+
+# ---- 共享的事件循环和HTTP连接池 ----
+# 所有LLM请求都在同一个后台事件循环中执行，同一服务地址的客户端共用一个连接池：
+# 同步调用方（线程池中的解题任务）和 FastAPI 的异步处理函数都复用已建立的 keep-alive 连接，
+# 连接池也不会被绑定到某个请求线程临时创建的事件循环上。
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+_breakers: Dict[str, "CircuitBreaker"] = {}
+# 正在进行中的相同请求（只在LLM事件循环中访问）
+_inflight: Dict[str, Dict[str, Any]] = {}
+_coalesce_stats = {"upstream": 0, "coalesced": 0}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """LLM服务的熔断器（同一服务地址的客户端共用）。
+
+    - closed：正常请求，连续失败 failure_threshold 次后进入 open；
+    - open：请求立即失败，不再访问服务；等待时间从 reset_timeout 开始，每次试探失败翻倍
+      （上限 max_reset_timeout，带随机抖动），到期后进入 half_open；
+    - half_open：只放行一个试探请求，成功则恢复 closed，失败则重新 open。
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 max_reset_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+        self.reset_timeout = reset_timeout or float(os.getenv("LLM_BREAKER_RESET", "5"))
+        self.max_reset_timeout = max_reset_timeout or float(os.getenv("LLM_BREAKER_MAX_RESET", "60"))
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._open_count = 0
+        self._retry_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """是否放行一个请求；放行的请求必须随后调用 record_success 或 record_failure"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() >= self._retry_at:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("✓ LLM服务恢复，熔断器关闭。")
+            self.state = CLOSED
+            self.failures = 0
+            self._open_count = 0
+            self._probing = False
+
+    def release(self):
+        """放行的请求被取消（既未成功也未失败）时调用，允许下一个试探请求"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        # 调用方已持有锁
+        delay = min(self.max_reset_timeout, self.reset_timeout * (2 ** self._open_count))
+        delay *= random.uniform(0.8, 1.2)
+        self._open_count += 1
+        self.trips += 1
+        self.state = OPEN
+        self._probing = False
+        self._retry_at = time.monotonic() + delay
+        logger.warning(f"✗ LLM服务连续失败 {self.failures} 次，熔断 {delay:.1f} 秒。")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_in": round(max(0.0, self._retry_at - time.monotonic()), 1) if self.state == OPEN else None,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+def _shared_breaker(base_url: str) -> CircuitBreaker:
+    with _loop_lock:
+        breaker = _breakers.get(base_url)
+        if breaker is None:
+            breaker = _breakers[base_url] = CircuitBreaker()
+        return breaker
+
+
+def _retryable(error: Exception) -> bool:
+    """连接错误、超时、429 和 5xx 值得重试并计入熔断；其他 4xx 是请求本身的问题"""
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
+
+def _backoff(attempt: int) -> float:
+    """指数退避 + 完全抖动（full jitter）"""
+    base = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    cap = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _llm_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _loop
+
+
+def _shared_client(base_url: str, api_key: str) -> AsyncOpenAI:
+    with _loop_lock:
+        client = _clients.get((base_url, api_key))
+        if client is None:
+            max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+            # 重试由 chat() 自己处理，SDK 内部不再重试
+            client = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+            _clients[(base_url, api_key)] = client
+        return client
+
+
+async def _on_llm_loop(coro: Awaitable[T]) -> T:
+    """在LLM事件循环中执行协程；调用方的任务被取消时，请求也随之取消"""
+    loop = _llm_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """在同步代码中等待LLM协程的结果（不能在LLM事件循环线程中调用）"""
+    return asyncio.run_coroutine_threadsafe(coro, _llm_loop()).result()
+
+
+def close_llm_clients():
+    """关闭共享的连接池和后台事件循环"""
+    global _loop
+    with _loop_lock:
+        clients, loop = list(_clients.values()), _loop
+        _clients.clear()
+        _loop = None
+    if loop is None or loop.is_closed():
+        return
+    for client in clients:
+        try:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"关闭LLM连接失败: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def parse_json_content(content: str) -> Dict:
+    """解析JSON模式的输出，去掉模型可能添加的代码块标记"""
+    try:
+        cleaned_content = re.sub(r"```(json)?\s*|\s*```", "", content or "").strip()
+        return json.loads(cleaned_content)
+    except json.JSONDecodeError:
+        return {"error": "LLM输出格式错误", "raw_content": content}
+
+
+class AsyncLLMClient:
+    """基于 AsyncOpenAI 的LLM客户端。
+
+    同一服务地址的实例共用一个HTTP连接池（上限 LLM_MAX_CONNECTIONS）和熔断器，每个请求有独立的超时
+    （默认 LLM_TIMEOUT 秒），并发请求互不阻塞；stream_chat 按生成顺序逐段返回文本。
+    失败的请求按指数退避重试；服务持续不可用时熔断器打开，请求立即返回错误而不再等待超时。
+    """
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 model: Optional[str] = None, timeout: Optional[float] = None):
+        base = base_url or os.getenv("OPENAI_API_BASE", "http://localhost:11434/v1")
+        key = api_key or os.getenv("OPENAI_API_KEY", "ollama")
+        self.model = model or os.getenv("LLM_MODEL", "qwen2.5:3b")
         if not base or not self.model:
             raise RuntimeError("Please set OPENAI_API_BASE and LLM_MODEL in .env")
-        
-        self.client = OpenAI(base_url=base, api_key=key)
+
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "120"))
+        self.client = _shared_client(base, key)
+        self.breaker = _shared_breaker(base)
+        self.coalesce = os.getenv("LLM_COALESCE", "true").lower() == "true"
         self.available = False
-        
-    def test_connection(self, max_retries: int = 1, retry_delay: int = 2) -> bool:
+
+    async def test_connection(self, max_retries: int = 1, retry_delay: int = 2) -> bool:
         """测试与本地LLM的连接，并带有重试机制"""
+        return await _on_llm_loop(self._test_connection(max_retries, retry_delay))
+
+    async def _test_connection(self, max_retries: int, retry_delay: int) -> bool:
         logger.info(f"开始测试LLM连接，目标模型: {self.model}, Base URL: {self.client.base_url}")
         for attempt in range(max_retries):
             try:
-                self.client.chat.completions.create(
+                await self.client.chat.completions.create(
                     model=self.model,
                     messages=[{"role": "user", "content": "Hello"}],
                     max_tokens=10,
@@ -38,66 +244,232 @@ class LLMClient:
                 logger.warning(f"LLM连接尝试 {attempt + 1}/{max_retries} 失败: {e.__class__.__name__}: {e}")
                 if attempt < max_retries - 1:
                     logger.info(f"将在 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-        
+                    await asyncio.sleep(retry_delay)
+
         logger.error("✗ LLM连接测试在多次重试后最终失败。请确认Ollama服务是否已启动并加载了模型。")
         self.available = False
         return False
 
-    def chat(
-        self, 
-        messages: List[Dict[str, str]], 
-        temperature: float = 0.2, 
+    async def ping(self, timeout: float = 5) -> Dict[str, Any]:
+        """轻量探测：请求 /models 列表而不生成文本，不占用模型推理。
+        返回 {ok, model_listed, error}，并更新 available"""
+        return await _on_llm_loop(self._ping(timeout))
+
+    async def _ping(self, timeout: float) -> Dict[str, Any]:
+        try:
+            models = await self.client.models.list(timeout=timeout)
+        except Exception as e:
+            self.available = False
+            return {"ok": False, "model_listed": False, "error": f"{e.__class__.__name__}: {e}"}
+        self.available = True
+        listed = any(m.id == self.model for m in models.data)
+        return {"ok": True, "model_listed": listed, "error": None}
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
         max_tokens: int = 800,
         json_mode: bool = False,
-        max_retries: int = 2
+        max_retries: int = 2,
+        timeout: Optional[float] = None
     ) -> Union[str, Dict, None]:
         """与本地LLM对话，支持JSON模式，并增加了健壮的错误处理和重试"""
-        
-        for attempt in range(max_retries):
-            try:
-                if not self.available:
-                     if not self.test_connection(max_retries=1, retry_delay=1):
-                        raise ConnectionError("无法连接到本地LLM服务。")
+        return await _on_llm_loop(self._coalesced_chat(messages, temperature, max_tokens, json_mode,
+                                                       max_retries, timeout))
+
+    async def _coalesced_chat(self, messages, temperature, max_tokens, json_mode, max_retries, timeout):
+        """相同的请求（服务地址、模型、消息和生成参数都相同）同时进行时只向服务发送一次，
+        所有调用方共享同一个结果。LLM_COALESCE=false 时关闭"""
+        if not self.coalesce:
+            return await self._chat(messages, temperature, max_tokens, json_mode, max_retries, timeout)
+        key = content_hash(json.dumps([str(self.client.base_url), self.model, messages, temperature, max_tokens,
+                                       json_mode], sort_keys=True, ensure_ascii=False))
+        flight = _inflight.get(key)
+        if flight is None:
+            _coalesce_stats["upstream"] += 1
+            task = asyncio.ensure_future(self._chat(messages, temperature, max_tokens, json_mode, max_retries, timeout))
+            flight = _inflight[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda done: _inflight.pop(key, None) if _inflight.get(key) is flight else None)
+        else:
+            _coalesce_stats["coalesced"] += 1
+        flight["waiters"] += 1
+        try:
+            # 某个调用方被取消时不影响其他调用方共享的请求；结果可能是字典，每个调用方各得一份副本
+            return copy.deepcopy(await asyncio.shield(flight["task"]))
+        except asyncio.CancelledError:
+            # 最后一个调用方也离开（如客户端断开连接）时取消请求，不再占用模型
+            if flight["waiters"] == 1 and not flight["task"].done():
+                flight["task"].cancel()
+                if _inflight.get(key) is flight:
+                    del _inflight[key]
+            raise
+        finally:
+            flight["waiters"] -= 1
 
-                resp = self.client.chat.completions.create(
+    async def _chat(self, messages, temperature, max_tokens, json_mode, max_retries, timeout):
+        error_message = "LLM服务在多次尝试后依然无响应。"
+        for attempt in range(max(1, max_retries)):
+            if not self.breaker.allow():
+                error_message = "LLM服务暂不可用（熔断中），请稍后重试。"
+                break
+            try:
+                resp = await self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
                     temperature=temperature,
                     max_tokens=max_tokens,
-                    response_format={"type": "json_object"} if json_mode else None
+                    response_format={"type": "json_object"} if json_mode else None,
+                    timeout=timeout or self.timeout
                 )
-                content = resp.choices[0].message.content
-                
-                if not json_mode:
-                    return content
-
-                try:
-                    cleaned_content = re.sub(r"```(json)?\s*|\s*```", "", content).strip()
-                    return json.loads(cleaned_content)
-                except json.JSONDecodeError:
-                    return {"error": "LLM输出格式错误", "raw_content": content}
-
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
             except Exception as e:
                 logger.error(f"LLM调用时发生错误 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                    continue
-                
                 error_message = f"LLM调用失败: {e}"
-                if json_mode:
-                    return {"error": error_message, "raw_content": ""}
-                return error_message
-        
-        final_error = "LLM服务在多次尝试后依然无响应。"
+                if not _retryable(e):
+                    # 服务可用，只是请求被拒绝
+                    self.breaker.record_success()
+                    break
+                self.breaker.record_failure()
+                self.available = False
+                if attempt < max_retries - 1 and self.breaker.state == CLOSED:
+                    await asyncio.sleep(_backoff(attempt))
+                    continue
+                break
+
+            self.breaker.record_success()
+            self.available = True
+            content = resp.choices[0].message.content
+            if not json_mode:
+                return content
+            return parse_json_content(content)
+
         if json_mode:
-            return {"error": final_error, "raw_content": ""}
-        return final_error
+            return {"error": error_message, "raw_content": ""}
+        return error_message
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: int = 800,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """流式对话，逐段返回生成的文本；连接失败时抛出异常（已经输出的内容无法重试）"""
+        chunks = self._stream_chat(messages, temperature, max_tokens, json_mode, timeout)
+        try:
+            while True:
+                try:
+                    yield await _on_llm_loop(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            await _on_llm_loop(chunks.aclose())
+
+    async def _stream_chat(self, messages, temperature, max_tokens, json_mode, timeout) -> AsyncIterator[str]:
+        if not self.breaker.allow():
+            raise ConnectionError("LLM服务暂不可用（熔断中），请稍后重试。")
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"} if json_mode else None,
+                timeout=timeout or self.timeout,
+                stream=True
+            )
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if _retryable(e):
+                self.breaker.record_failure()
+                self.available = False
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        self.available = True
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
 
     def get_model_info(self) -> Dict[str, Any]:
         """获取模型信息"""
         return {
             "model": self.model,
             "base_url": self.client.base_url,
-            "available": self.available
-        }
\ No newline at end of file
+            "available": self.available,
+            "circuit": self.breaker.snapshot(),
+            "requests": dict(_coalesce_stats)
+        }
+
+
+class LLMClient:
+    """同步接口，供线程中运行的代码使用；请求由共享的 AsyncLLMClient 在后台事件循环中执行。
+
+    FastAPI 的 async 处理函数应直接使用 .aclient，避免阻塞事件循环。
+    """
+
+    def __init__(self):
+        self.aclient = AsyncLLMClient()
+        self.model = self.aclient.model
+        self.client = self.aclient.client
+
+    @property
+    def available(self) -> bool:
+        return self.aclient.available
+
+    @available.setter
+    def available(self, value: bool):
+        self.aclient.available = value
+
+    def test_connection(self, max_retries: int = 1, retry_delay: int = 2) -> bool:
+        """测试与本地LLM的连接，并带有重试机制"""
+        return run_sync(self.aclient.test_connection(max_retries, retry_delay))
+
+    def ping(self, timeout: float = 5) -> Dict[str, Any]:
+        """轻量探测LLM服务（/models），不生成文本"""
+        return run_sync(self.aclient.ping(timeout))
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: int = 800,
+        json_mode: bool = False,
+        max_retries: int = 2,
+        timeout: Optional[float] = None
+    ) -> Union[str, Dict, None]:
+        """与本地LLM对话，支持JSON模式，并增加了健壮的错误处理和重试"""
+        return run_sync(self.aclient.chat(messages, temperature, max_tokens, json_mode, max_retries, timeout))
+
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: int = 800,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> Iterator[str]:
+        """流式对话的同步版本"""
+        chunks = self.aclient.stream_chat(messages, temperature, max_tokens, json_mode, timeout)
+        try:
+            while True:
+                try:
+                    yield run_sync(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            run_sync(chunks.aclose())
+
+    def get_model_info(self) -> Dict[str, Any]:
+        """获取模型信息"""
+        return self.aclient.get_model_info()
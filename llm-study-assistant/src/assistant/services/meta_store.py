@@ -0,0 +1,211 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from .lexical import TOKENIZER_ID, index_text, match_expression
+
+# 计数器表中维护的增量统计，使 /api/knowledge/stats 为 O(1)；lexical_tokenizer 记录倒排索引使用的分词器
+COUNTERS = ("total_chunks", "total_docs", "next_id", "applied_seq", "initialized", "lexical_tokenizer")
+
+
+class MetaStore:
+    """块元数据的 SQLite 存储。
+
+    - chunks: 每个块一行，以稳定的块ID为主键，按 doc_id 和内容哈希建索引；
+      正文只在检索命中时按ID读取，不再整体加载到内存。
+    - docs: 每个文档的块数，随写入增量维护。
+    - chunks_fts: 块正文的 FTS5 倒排索引（rowid 即块ID），用于 BM25 检索。
+    - counters: 总块数、总文档数、下一个块ID，以及已应用到的 journal 序号(applied_seq)。
+
+    每次写入在一个事务内完成并同时推进 applied_seq，崩溃后由 journal 回放补齐。
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id);
+            CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks(hash);
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY,
+                chunks INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(tokens, tokenize = 'unicode61');
+            """
+        )
+        self._conn.commit()
+        rows = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        self.counters = {name: rows.get(name, 0) for name in COUNTERS}
+        if self.counters["lexical_tokenizer"] != TOKENIZER_ID:
+            self._rebuild_lexical()
+
+    def _rebuild_lexical(self):
+        """首次启用或分词器变化（如新安装了 jieba）时，从 chunks 表重建倒排索引"""
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM chunks_fts")
+                cursor = self._conn.execute("SELECT id, text FROM chunks")
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    self._conn.executemany("INSERT INTO chunks_fts (rowid, tokens) VALUES (?, ?)",
+                                           [(cid, index_text(text)) for cid, text in rows])
+                self._save_counters({"lexical_tokenizer": TOKENIZER_ID})
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self.counters["lexical_tokenizer"] = TOKENIZER_ID
+
+    @property
+    def initialized(self) -> bool:
+        return bool(self.counters["initialized"])
+
+    @property
+    def applied_seq(self) -> int:
+        return self.counters["applied_seq"]
+
+    @property
+    def next_id(self) -> int:
+        return self.counters["next_id"]
+
+    @property
+    def total_chunks(self) -> int:
+        return self.counters["total_chunks"]
+
+    @property
+    def total_docs(self) -> int:
+        return self.counters["total_docs"]
+
+    def _save_counters(self, counters: Dict[str, int]):
+        self._conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            list(counters.items()),
+        )
+
+    def _select_in(self, sql: str, ids: List[int]) -> List[tuple]:
+        """执行带 IN (...) 的查询；SQLite 单条语句的参数数量有限，分批执行"""
+        rows = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows.extend(self._conn.execute(sql.format(",".join("?" * len(batch))), batch).fetchall())
+        return rows
+
+    def apply(self, seq: int, added: List[Dict], removed: List[int]):
+        """在一个事务内删除 removed、写入 added（ID已存在的视为更新），并推进 applied_seq"""
+        with self._lock:
+            counters = dict(self.counters)
+            doc_delta: Dict[str, int] = {}
+
+            # ID已存在的新行（替换文档时沿用的块）先按删除处理，再重新写入
+            stale = list(dict.fromkeys(list(removed) + [m["id"] for m in added]))
+            for doc_id, count in self._select_in(
+                    "SELECT doc_id, COUNT(*) FROM chunks WHERE id IN ({}) GROUP BY doc_id", stale):
+                doc_delta[doc_id] = doc_delta.get(doc_id, 0) - count
+            for m in added:
+                doc_delta[m["doc_id"]] = doc_delta.get(m["doc_id"], 0) + 1
+
+            try:
+                for start in range(0, len(stale), 500):
+                    batch = stale[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    cur = self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+                    counters["total_chunks"] -= cur.rowcount
+                    self._conn.execute(f"DELETE FROM chunks_fts WHERE rowid IN ({placeholders})", batch)
+                self._conn.executemany(
+                    "INSERT INTO chunks (id, doc_id, chunk_id, text, hash) VALUES (?, ?, ?, ?, ?)",
+                    [(m["id"], m["doc_id"], m["chunk_id"], m["text"], m.get("hash")) for m in added],
+                )
+                self._conn.executemany(
+                    "INSERT INTO chunks_fts (rowid, tokens) VALUES (?, ?)",
+                    [(m["id"], index_text(m["text"])) for m in added],
+                )
+                counters["total_chunks"] += len(added)
+
+                for doc_id, delta in doc_delta.items():
+                    if delta == 0:
+                        continue
+                    row = self._conn.execute("SELECT chunks FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+                    before = row[0] if row else 0
+                    after = before + delta
+                    if after > 0:
+                        self._conn.execute(
+                            "INSERT INTO docs (doc_id, chunks) VALUES (?, ?) "
+                            "ON CONFLICT(doc_id) DO UPDATE SET chunks = excluded.chunks", (doc_id, after))
+                    else:
+                        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+                    counters["total_docs"] += (after > 0) - (before > 0)
+
+                if added:
+                    counters["next_id"] = max(counters["next_id"], max(m["id"] for m in added) + 1)
+                counters["applied_seq"] = max(counters["applied_seq"], seq)
+                self._save_counters(counters)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self.counters = counters
+
+    def import_rows(self, rows: Iterable[Dict], seq: int):
+        """从旧版 meta.jsonl 快照一次性导入元数据"""
+        rows = list(rows)
+        self.apply(seq, rows, [])
+        with self._lock:
+            self.counters["initialized"] = 1
+            self._save_counters({"initialized": 1})
+            self._conn.commit()
+
+    def get_many(self, ids: List[int]) -> Dict[int, Dict]:
+        """按块ID读取元数据（含正文），只用于检索命中的 top-k"""
+        with self._lock:
+            rows = self._select_in("SELECT id, doc_id, chunk_id, text, hash FROM chunks WHERE id IN ({})", ids)
+        return {r[0]: {"id": r[0], "doc_id": r[1], "chunk_id": r[2], "text": r[3], "hash": r[4]} for r in rows}
+
+    def lexical_search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """BM25 检索，返回按相关度排序的 (块ID, BM25分数)；分数越大越相关"""
+        expression = match_expression(query)
+        if not expression:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, bm25(chunks_fts) AS rank FROM chunks_fts WHERE chunks_fts MATCH ? "
+                "ORDER BY rank LIMIT ?", (expression, limit)
+            ).fetchall()
+        # FTS5 的 bm25() 返回负数，越小越相关
+        return [(r[0], -r[1]) for r in rows]
+
+    def doc_chunks(self, doc_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chunk_id, text FROM chunks WHERE doc_id = ? ORDER BY chunk_id", (doc_id,)
+            ).fetchall()
+        return [{"id": r[0], "chunk_id": r[1], "text": r[2]} for r in rows]
+
+    def has_document(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM docs WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def list_documents(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_id, chunks FROM docs ORDER BY doc_id").fetchall()
+        return [{"doc_id": r[0], "chunks": r[1]} for r in rows]
+
+    def all_ids(self) -> List[int]:
+        """全部块ID，仅在重建索引时使用"""
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT id FROM chunks ORDER BY id")]
@@ -0,0 +1,137 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 模型状态
+NOT_LOADED, LOADING, READY, FAILED = "not_loaded", "loading", "ready", "failed"
+
+
+class _Entry:
+    def __init__(self, kind: str, name: str, factory: Callable[[], Any]):
+        self.kind = kind
+        self.name = name
+        self.factory = factory
+        self.status = NOT_LOADED
+        self.model = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """进程内共享的模型注册表：每个模型只加载一次，所有管线和向量存储共用同一实例。
+
+    模型在第一次使用时加载，也可以通过 warm_up 在后台线程中预先加载，
+    这样服务启动后立即可以接收请求，模型状态通过 /api/health 查询。
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, kind: str, name: str, factory: Callable[[], Any]) -> _Entry:
+        with self._lock:
+            entry = self._entries.get((kind, name))
+            if entry is None:
+                entry = self._entries[(kind, name)] = _Entry(kind, name, factory)
+            return entry
+
+    def _get(self, entry: _Entry):
+        """返回已加载的模型，必要时在当前线程加载；加载失败返回 None 且不再重试"""
+        if entry.status == READY:
+            return entry.model
+        with entry.lock:
+            if entry.status in (NOT_LOADED, LOADING):
+                entry.status = LOADING
+                start = time.perf_counter()
+                try:
+                    logger.info(f"加载模型 {entry.kind}: {entry.name}")
+                    entry.model = entry.factory()
+                    entry.load_seconds = round(time.perf_counter() - start, 2)
+                    entry.status = READY
+                    logger.info(f"✓ 模型 {entry.name} 加载完成，用时 {entry.load_seconds} 秒")
+                except Exception as e:
+                    entry.error = str(e)
+                    entry.status = FAILED
+                    logger.error(f"✗ 无法加载模型 {entry.name}: {e}")
+            return entry.model
+
+    def _embedding_entry(self, name: str) -> _Entry:
+        return self._entry("embedding", name, lambda: SentenceTransformer(name))
+
+    def _cross_encoder_entry(self, name: str, max_length: int) -> _Entry:
+        return self._entry("cross_encoder", name,
+                           lambda: CrossEncoder(name, max_length=max_length, device="cpu"))
+
+    def embedding_model(self, name: str):
+        """获取 Embedding 模型（阻塞直到加载完成）"""
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            return None
+        return self._get(self._embedding_entry(name))
+
+    def cross_encoder(self, name: str, max_length: int = 512):
+        """获取交叉编码器（阻塞直到加载完成）"""
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            return None
+        return self._get(self._cross_encoder_entry(name, max_length))
+
+    def status(self, kind: str, name: str) -> str:
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            return FAILED
+        with self._lock:
+            entry = self._entries.get((kind, name))
+        return entry.status if entry else NOT_LOADED
+
+    def is_ready(self, kind: str, name: str) -> bool:
+        return self.status(kind, name) == READY
+
+    def warm_up(self, embedding_models=(), cross_encoders=()) -> Optional[threading.Thread]:
+        """在后台线程中依次加载模型；cross_encoders 为 (模型名, max_length) 列表"""
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            return None
+        # 先登记条目，使 /api/health 立即显示为待加载
+        entries = [self._embedding_entry(name) for name in embedding_models]
+        entries += [self._cross_encoder_entry(name, max_length) for name, max_length in cross_encoders]
+        pending = [e for e in entries if e.status == NOT_LOADED]
+        if not pending:
+            return None
+        for entry in pending:
+            entry.status = LOADING
+
+        def run():
+            for entry in pending:
+                self._get(entry)
+
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def snapshot(self) -> Dict[str, Any]:
+        """所有已登记模型的状态，用于健康检查"""
+        with self._lock:
+            entries = list(self._entries.values())
+        models = [{
+            "kind": e.kind,
+            "name": e.name,
+            "status": e.status,
+            "load_seconds": e.load_seconds,
+            "error": e.error,
+        } for e in entries]
+        return {
+            "available": SENTENCE_TRANSFORMERS_AVAILABLE,
+            "ready": all(m["status"] == READY for m in models),
+            "models": models,
+        }
+
+
+# 进程内唯一的注册表
+registry = ModelRegistry()
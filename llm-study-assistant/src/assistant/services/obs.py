@@ -139,9 +139,18 @@ class OBSController:
             status = self.get_recording_status()
             if not status.is_recording:
                 return RecordingResponse(success=False, message="当前未在录屏", status=status)
-            self.client.stop_record()
+            scene_name = status.current_program_scene
+            result = self.client.stop_record()
+            output_path = getattr(result, "output_path", None)
+            if output_path and scene_name:
+                # 记录录像时的场景，分析视频时据此选择OCR的ROI配置
+                try:
+                    with open(output_path + ".json", "w", encoding="utf-8") as f:
+                        json.dump({"scene": scene_name}, f, ensure_ascii=False)
+                except OSError as e:
+                    logger.warning(f"无法写入录像场景信息: {e}")
             new_status = self.get_recording_status()
-            return RecordingResponse(success=True, message="停止录屏成功", status=new_status)
+            return RecordingResponse(success=True, message="停止录屏成功", status=new_status, file_path=output_path)
         except Exception as e:
             return RecordingResponse(success=False, message=f"停止录屏失败: {str(e)}")
 
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from .embedding_cache import content_hash
+
+
+def file_hash(path: str) -> str:
+    """文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """视频OCR结果的磁盘缓存。
+
+    键为 (视频内容哈希, OCR模型, 采样/预处理参数)，值为每个识别出文本的帧的
+    {index, timestamp, text, lines}（zlib 压缩的 JSON）。同一录像再次分析（如修改提示词后）
+    时直接读取缓存，不再解码和OCR。
+
+    - 视频哈希按 (路径, 大小, 修改时间) 记忆，未变化的文件不重复读取整个视频；
+    - 缓存总大小超过 max_bytes 时按最近访问时间淘汰（LRU）。
+    """
+
+    def __init__(self, db_path: str, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.getenv("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                key TEXT PRIMARY KEY,
+                video_hash TEXT NOT NULL,
+                params TEXT NOT NULL,
+                frames BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ocr_results_access ON ocr_results(last_access);
+            CREATE TABLE IF NOT EXISTS video_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def video_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, hash FROM video_hashes WHERE path = ?",
+                                     (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = file_hash(path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO video_hashes VALUES (?, ?, ?, ?)",
+                               (path, stat.st_size, stat.st_mtime_ns, digest))
+            self._conn.commit()
+        return digest
+
+    @staticmethod
+    def make_key(video_hash: str, params: Dict[str, Any]) -> str:
+        return content_hash(video_hash + json.dumps(params, sort_keys=True, ensure_ascii=False))
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT frames FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE ocr_results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, video_hash: str, params: Dict[str, Any], frames: List[Dict[str, Any]]):
+        blob = zlib.compress(json.dumps(frames, ensure_ascii=False).encode("utf-8"))
+        if self.max_bytes and len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, video_hash, json.dumps(params, sort_keys=True, ensure_ascii=False), blob, len(blob), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_results ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM ocr_results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> int:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM ocr_results").rowcount
+            self._conn.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_results").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+_cache: Optional[OCRCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """进程内共享的OCR结果缓存；OCR_CACHE_ENABLED=false 时返回 None"""
+    global _cache
+    if os.getenv("OCR_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            data_dir = os.getenv("DATA_DIR", "./data")
+            os.makedirs(data_dir, exist_ok=True)
+            _cache = OCRCache(os.path.join(data_dir, "ocr_cache.db"))
+        return _cache
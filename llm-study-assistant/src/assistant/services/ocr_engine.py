@@ -0,0 +1,141 @@
+import os
+import time
+import logging
+import threading
+from importlib import metadata
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+logger = logging.getLogger(__name__)
+
+
+_process_limits = None
+
+
+def limit_process_threads(threads: int):
+    """把当前进程的 torch 和 OpenMP/BLAS 线程数限制为 threads。
+
+    这些设置对整个进程生效，只在OCR工作进程中调用：服务进程内同时运行的 Embedding 模型、
+    重排序模型和 FAISS 不应被OCR的线程预算拖慢。必须在导入 torch 之前调用。
+    """
+    global _process_limits
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    if threadpool_limits is not None:
+        _process_limits = threadpool_limits(limits=threads)
+
+
+class OCREngine:
+    """可复用的 EasyOCR 引擎。
+
+    - easyocr/torch 在第一次识别时才导入并加载模型，不分析视频的进程没有任何启动开销；
+    - 识别在OCR工作进程中进行（见 OCRPipeline）：threads 由工作进程传入，加载模型后把 torch
+      线程数设为 threads。torch 的线程数是进程级设置，不在服务进程内限制，
+      以免拖慢同时运行的 Embedding 模型和 FAISS；
+    - EasyOCR 的 Reader 不是线程安全的，同一引擎上的识别调用串行执行。
+    """
+
+    def __init__(self, languages: Optional[List[str]] = None, threads: Optional[int] = None,
+                 gpu: Optional[str] = None):
+        self.languages = languages or [
+            lang.strip() for lang in os.getenv("OCR_LANGUAGES", "ch_sim,en").split(",") if lang.strip()
+        ]
+        self.threads = threads
+        self.gpu = (gpu or os.getenv("OCR_GPU", "auto")).lower()
+        self._reader = None
+        self._error: Optional[str] = None
+        self._load_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _use_gpu(self) -> bool:
+        if self.gpu in ("true", "false"):
+            return self.gpu == "true"
+        try:
+            import torch
+            return torch.cuda.is_available() or (torch.backends.mps.is_available() and torch.backends.mps.is_built())
+        except Exception:
+            return False
+
+    def _load(self):
+        # 在这里才导入 easyocr：导入它会同时加载 torch
+        import easyocr
+
+        use_gpu = self._use_gpu()
+        logger.info(f"加载OCR模型 {self.languages}，GPU: {use_gpu}，线程数: {self.threads or '进程默认'}")
+        start = time.perf_counter()
+        if self.threads:
+            try:
+                import torch
+                torch.set_num_threads(self.threads)
+            except ImportError:
+                pass
+        self._reader = easyocr.Reader(self.languages, gpu=use_gpu)
+        self._load_seconds = round(time.perf_counter() - start, 2)
+        logger.info(f"✓ OCR模型加载完成，用时 {self._load_seconds} 秒")
+
+    @property
+    def loaded(self) -> bool:
+        return self._reader is not None
+
+    def readtext(self, image, **kwargs) -> List[Any]:
+        """识别一帧图像，参数与 easyocr.Reader.readtext 相同"""
+        with self._lock:
+            if self._reader is None:
+                try:
+                    self._load()
+                except Exception as e:
+                    # 记录失败原因供状态接口展示；下次识别时会重新尝试加载
+                    self._error = f"{e.__class__.__name__}: {e}"
+                    logger.error(f"✗ OCR模型加载失败: {self._error}")
+                    raise
+                self._error = None
+            return self._reader.readtext(image, **kwargs)
+
+    def recognize(self, image, batch_size: int = 1) -> Tuple[str, List[Dict[str, Any]]]:
+        """识别一帧图像，返回 (按段落合并的文本, 文本行列表)。
+
+        文本行为 {"box": 四个角点, "text", "confidence"}；合并文本与 readtext(paragraph=True)
+        的结果相同，但保留了段落模式下会丢弃的逐行位置和置信度。
+        """
+        from easyocr.utils import get_paragraph
+
+        raw = self.readtext(image, detail=1, paragraph=False, batch_size=batch_size)
+        lines = [{"box": [[int(x), int(y)] for x, y in box], "text": text, "confidence": round(float(conf), 4)}
+                 for box, text, conf in raw]
+        paragraphs = get_paragraph([[line["box"], line["text"], line["confidence"]] for line in lines]) if lines else []
+        return " ".join(p[1] for p in paragraphs), lines
+
+    @property
+    def model_id(self) -> str:
+        """OCR模型标识（引擎版本 + 语言），用作OCR结果缓存键的一部分"""
+        try:
+            version = metadata.version("easyocr")
+        except metadata.PackageNotFoundError:
+            version = "unknown"
+        return f"easyocr-{version}:{'+'.join(self.languages)}"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "languages": self.languages,
+            "threads": self.threads,
+            "load_seconds": self._load_seconds,
+            "error": self._error,
+        }
+
+
+_engine: Optional[OCREngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine() -> OCREngine:
+    """进程内共享的 OCR 引擎（只创建对象，模型在第一次识别时加载）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OCREngine()
+        return _engine
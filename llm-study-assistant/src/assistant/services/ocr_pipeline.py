@@ -0,0 +1,207 @@
+import os
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .ocr_engine import OCREngine, limit_process_threads
+from .frame_sampler import SampledFrame
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class FrameText(NamedTuple):
+    index: int
+    timestamp: float
+    text: str
+    lines: List[Dict[str, Any]]   # 逐行的位置和置信度，见 OCREngine.recognize
+
+
+# ---- 工作进程 ----
+# 每个工作进程持有自己的 OCREngine，模型在进程内第一次识别时加载并一直复用
+
+_worker_engine: Optional[OCREngine] = None
+
+
+def _init_worker(threads: int):
+    global _worker_engine
+    limit_process_threads(threads)
+    _worker_engine = OCREngine(threads=threads)
+
+
+def _ocr_batch(images: List[np.ndarray],
+               batch_size: int) -> Tuple[List[Optional[Tuple[str, List[Dict[str, Any]]]]], Dict[str, Any]]:
+    """识别一批帧，同时返回工作进程中引擎的状态（是否已加载、加载用时等）"""
+    results = []
+    for image in images:
+        try:
+            results.append(_worker_engine.recognize(image, batch_size=batch_size))
+        except Exception as e:
+            logger.error(f"OCR识别失败: {e}")
+            results.append(None)
+    return results, _worker_engine.status()
+
+
+class OCRPipeline:
+    """视频OCR的生产者/消费者流水线。
+
+    解码线程把采样帧放入容量为 queue_size 的有界队列；主线程按 batch_size 帧组成批次，
+    交给 workers 个工作进程识别（至少一个），同时在途的批次不超过 2 * workers 个，
+    内存占用由队列深度和批次数决定，与视频长度无关。结果按帧的先后顺序输出。
+
+    识别总是在独立的工作进程中进行：每个进程的 torch/OpenMP 线程数限制为 threads，
+    这一进程级设置不会影响服务进程中的 Embedding 模型和 FAISS。
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        self.workers = max(1, workers or int(os.getenv("OCR_WORKERS", "1")))
+        # 每个进程的线程预算，合计不超过CPU核心数
+        self.threads = int(os.getenv("OCR_THREADS", "0")) or max(1, (os.cpu_count() or 1) // self.workers)
+        self.batch_size = batch_size or int(os.getenv("OCR_BATCH_SIZE", "4"))
+        self.queue_size = queue_size or int(os.getenv("OCR_QUEUE_SIZE", "16"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._engine_status: Optional[Dict[str, Any]] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                logger.info(f"启动 {self.workers} 个OCR工作进程，每个进程 {self.threads} 个线程")
+                # spawn 启动的子进程不继承父进程中的线程和已加载的模型
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.threads,),
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def status(self) -> Dict[str, Any]:
+        """工作进程配置，以及最近一次识别时工作进程中OCR引擎的状态"""
+        return {
+            "workers": self.workers,
+            "threads": self.threads,
+            "running": self._pool is not None,
+            "engine": self._engine_status,
+        }
+
+    def run(self, frames: Iterable[SampledFrame]) -> List[FrameText]:
+        """识别所有帧，返回按时间戳排序的结果（识别失败或无文本的帧不返回）"""
+        results = [r for r in self.iter_results(frames) if r is not None]
+        results.sort(key=lambda r: r.timestamp)
+        return results
+
+    def iter_results(self, frames: Iterable[SampledFrame],
+                     idle_seconds: float = 0.5) -> Iterator[Optional[FrameText]]:
+        """边识别边按帧的先后顺序返回结果。
+
+        解码端超过 idle_seconds 没有新帧时，先提交未满的批次，并返回一次 None，
+        调用方可以借此汇报进度。
+        """
+        frame_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        errors: List[BaseException] = []
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            # 队列满时阻塞等待，消费端出错或提前结束后不再等待
+            while not stop.is_set():
+                try:
+                    frame_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for frame in frames:
+                    if not put(frame):
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(_DONE)
+
+        decoder = threading.Thread(target=produce, name="video-decoder", daemon=True)
+        decoder.start()
+
+        # 按提交顺序排列的在途批次，只有队首完成时才输出，保证结果顺序
+        in_flight: Deque[Tuple[Future, List[SampledFrame]]] = deque()
+
+        def submit(batch: List[SampledFrame]):
+            if len(in_flight) >= 2 * self.workers:
+                wait([in_flight[0][0]])
+            future = self._get_pool().submit(_ocr_batch, [frame.image for frame in batch], self.batch_size)
+            in_flight.append((future, batch))
+
+        def ready(block: bool = False) -> Iterator[FrameText]:
+            while in_flight and (block or in_flight[0][0].done()):
+                future, batch = in_flight.popleft()
+                results, self._engine_status = future.result()
+                for frame, result in zip(batch, results):
+                    if result and result[0]:
+                        yield FrameText(frame.index, frame.timestamp, *result)
+
+        try:
+            batch = []
+            while True:
+                try:
+                    item = frame_queue.get(timeout=idle_seconds)
+                except queue.Empty:
+                    if batch:
+                        submit(batch)
+                        batch = []
+                    yield from ready()
+                    yield None
+                    continue
+                if item is _DONE:
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    submit(batch)
+                    batch = []
+                yield from ready()
+            if batch:
+                submit(batch)
+            yield from ready(block=True)
+        finally:
+            stop.set()
+            for future, _ in in_flight:
+                future.cancel()
+            decoder.join(timeout=5)
+
+        if errors:
+            raise errors[0]
+
+
+_pipeline: Optional[OCRPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_ocr_pipeline() -> OCRPipeline:
+    """进程内共享的OCR流水线；工作进程池在第一次使用时启动并在多次分析间复用"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = OCRPipeline()
+        return _pipeline
+
+
+def shutdown_ocr_pipeline():
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.shutdown()
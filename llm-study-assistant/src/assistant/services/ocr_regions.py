@@ -0,0 +1,145 @@
+import os
+import json
+import fnmatch
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]  # x, y, w, h
+
+# 文字区域检测所用缩略图的宽度
+DETECT_WIDTH = 640
+
+
+def load_profiles(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """读取 ROI 配置文件。
+
+    键为 OBS 场景名或录像文件名的通配符（如 "recording_2024*"），值为：
+    {"roi": [x, y, w, h], "auto_detect": true, "max_width": 1600}
+    roi 的四个值都不大于 1 时按画面比例解释，否则按像素解释；未配置的字段取环境变量默认值。
+    """
+    path = path or os.getenv("OCR_ROI_PROFILES", os.path.join(os.getenv("DATA_DIR", "./data"), "roi_profiles.json"))
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"ROI配置读取失败 {path}: {e}")
+        return {}
+
+
+def scene_of_recording(video_path: str) -> Optional[str]:
+    """录像停止时记录在 <录像>.json 中的 OBS 场景名"""
+    sidecar = video_path + ".json"
+    if not os.path.exists(sidecar):
+        return None
+    try:
+        with open(sidecar, "r", encoding="utf-8") as f:
+            return json.load(f).get("scene")
+    except Exception:
+        return None
+
+
+def resolve_profile(video_path: str, name: Optional[str] = None,
+                    profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """按 显式指定的名称 → 录像时的OBS场景 → 录像文件名通配 → default 的顺序选择 ROI 配置"""
+    profiles = load_profiles() if profiles is None else profiles
+    for key in (name, scene_of_recording(video_path)):
+        if key and key in profiles:
+            return {"name": key, **profiles[key]}
+    filename = os.path.basename(video_path)
+    for key, profile in profiles.items():
+        if key != "default" and fnmatch.fnmatch(filename, key):
+            return {"name": key, **profile}
+    return {"name": "default", **profiles.get("default", {})}
+
+
+def _to_pixels(roi, width: int, height: int) -> Box:
+    x, y, w, h = roi
+    if max(x, y, w, h) <= 1:
+        x, y, w, h = x * width, y * height, w * width, h * height
+    x, y = max(0, int(x)), max(0, int(y))
+    return x, y, max(1, min(int(w), width - x)), max(1, min(int(h), height - y))
+
+
+def detect_text_region(image: np.ndarray, padding: float = 0.02, max_coverage: float = 0.8) -> Optional[Box]:
+    """在缩略图上用形态学方法粗略定位文字行，返回覆盖所有文字行的全分辨率区域。
+
+    没有检测到任何文字时返回 None；文字区域超过画面的 max_coverage 时返回整幅画面。
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, DETECT_WIDTH / width)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1 else gray
+
+    # 文字笔画处梯度大：梯度 → Otsu 二值化 → 水平闭运算把同一行的字连成一块
+    grad = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    small_h, small_w = small.shape[:2]
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        # 过滤噪点和大块图形（图片、窗口边框）
+        if w < 8 or h < 4 or h > small_h * 0.3:
+            continue
+        if cv2.countNonZero(binary[y:y + h, x:x + w]) < 0.2 * w * h:
+            continue
+        boxes.append((x, y, x + w, y + h))
+    if not boxes:
+        return None
+
+    x0, y0 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+    x1, y1 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+    if (x1 - x0) * (y1 - y0) >= max_coverage * small_w * small_h:
+        return 0, 0, width, height
+
+    pad_x, pad_y = int(padding * small_w), int(padding * small_h)
+    x0, y0 = max(0, x0 - pad_x), max(0, y0 - pad_y)
+    x1, y1 = min(small_w, x1 + pad_x), min(small_h, y1 + pad_y)
+    return (int(x0 / scale), int(y0 / scale),
+            min(width, int((x1 - x0) / scale) + 1), min(height, int((y1 - y0) / scale) + 1))
+
+
+class FramePreprocessor:
+    """OCR前的帧预处理：裁剪固定ROI → （画面变化检测）→ 自动定位文字区域 → 分辨率归一化"""
+
+    def __init__(self, profile: Optional[Dict[str, Any]] = None):
+        profile = profile or {}
+        self.name = profile.get("name", "default")
+        self.roi = profile.get("roi")
+        self.auto_detect = profile.get("auto_detect", os.getenv("OCR_AUTO_ROI", "true").lower() == "true")
+        self.max_width = int(profile.get("max_width", os.getenv("OCR_MAX_WIDTH", "1600")))
+        self.no_text = 0
+
+    def crop_roi(self, image: np.ndarray) -> np.ndarray:
+        """裁剪配置中的固定区域（在画面变化检测之前进行，区域外的时钟、鼠标不触发OCR）"""
+        if not self.roi:
+            return image
+        x, y, w, h = _to_pixels(self.roi, image.shape[1], image.shape[0])
+        return image[y:y + h, x:x + w]
+
+    def prepare(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """返回交给OCR的图像；未检测到文字时返回 None，跳过该帧"""
+        if self.auto_detect:
+            box = detect_text_region(image)
+            if box is None:
+                self.no_text += 1
+                return None
+            x, y, w, h = box
+            image = image[y:y + h, x:x + w]
+
+        # 超过 max_width 的画面等比缩小，4K 录像的文字在 1600 宽度下仍然清晰
+        if self.max_width and image.shape[1] > self.max_width:
+            scale = self.max_width / image.shape[1]
+            image = cv2.resize(image, (self.max_width, max(1, int(image.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(image)
@@ -1,3 +1,6 @@
+import re
+from typing import List, Optional, Union
+
 
 # 系统提示词
 SYSTEM_PROMPT = """你是一名严谨的教学习练助手。你的用途仅限学习与自测，不为考试期间的任何实时答题提供帮助。
@@ -87,6 +90,63 @@ SOLVER_SUBJ = """题型：subjective
 输出格式：
 {"type":"subjective","final_answer":"3-5句的简要作答","confidence":0.0,"supporting_sources":["doc#1","..."]}"""
 
+# 单次调用完成题型判断和解题（视频题目在规则无法判断题型时使用）
+SOLVER_AUTO = """题型：未知，请先判断题型，再按该题型作答
+题型判断标准：
+- single_choice: 有 A/B/C/D 等选项，只有一个正确答案
+- multi_choice: 有选项，可以有多个正确答案
+- true_false: 判断题，只有“正确/错误”或“对/错”两种结论
+- subjective: 没有固定选项，需要文字阐述答案
+题目来自视频OCR，格式可能混乱；无法确定题型时按 subjective 作答。
+
+各题型 final_answer 的格式：
+- single_choice: 正确选项的完整文本
+- multi_choice: 所有正确选项的字母，如 ["A","C"]
+- true_false: "True" 或 "False"
+- subjective: 3-5句的简要作答
+
+输出格式：
+{"type":"single_choice|multi_choice|true_false|subjective","final_answer":...,"confidence":0.0,"brief_rationale":"...","supporting_sources":["doc#1","..."]}"""
+
+QUESTION_TYPES = ("single_choice", "multi_choice", "true_false", "subjective")
+
+# 选项标记，如 "A." "B、" "(C)" "D）"；OCR文本中选项之间常常没有空格
+_OPTION_MARK = re.compile(r"(?<![A-Za-z0-9])([A-Ha-h])\s*[.．、:：)）]")
+# 判断题的选项内容
+_TF_OPTION = re.compile(r"^(对|错|正确|错误|√|×|是|否|true|false|t|f)$", re.I)
+_TF_HINT = re.compile(r"判断题|判断正误|判断对错")
+# 题末的空括号（或 √/× 括号）：选择题也用“（ ）”作答题空，只在没有选项时视为判断题
+_TF_BLANK = re.compile(r"[（(]\s*[√×]?\s*[)）]\s*$")
+_MULTI_HINT = re.compile(r"多选|多项选择|不定项|选出所有|全部正确的|哪几项")
+
+
+def rule_classify(question: str, options: Optional[Union[str, List[str]]] = None) -> Optional[str]:
+    """按题面规则判断明显的题型，无法确定时返回 None（交给LLM判断）。
+
+    - 选项只有 对/错、正确/错误、√/× 之类 → true_false（选项可以带 A、B 标号，也可以是
+      ["对", "错"] 这样的列表）；
+    - 有 A、B 等至少两个选项 → 题干提示多选时为 multi_choice，否则为 single_choice；
+    - 题干标明“判断题”，或没有选项且以空括号结尾 → true_false。
+    """
+    question = question or ""
+    text = "\n".join(options) if isinstance(options, list) else (options or "")
+    marks = list(_OPTION_MARK.finditer(text))
+    if marks:
+        contents = [text[m.end():(marks[i + 1].start() if i + 1 < len(marks) else len(text))]
+                    for i, m in enumerate(marks)]
+    else:
+        contents = options if isinstance(options, list) else text.splitlines()
+    contents = [c.strip(" \t\n.。") for c in contents if c and c.strip(" \t\n.。")]
+    if contents and all(_TF_OPTION.match(c) for c in contents):
+        return "true_false"
+
+    letters = {m.group(1).upper() for m in marks}
+    if len(letters) >= 2 and {"A", "B"} <= letters:
+        return "multi_choice" if _MULTI_HINT.search(question) else "single_choice"
+    if _TF_HINT.search(question) or (not contents and _TF_BLANK.search(question)):
+        return "true_false"
+    return None
+
 # 合规检查关键词
 COMPLIANCE_KEYWORDS = [
     # 考试相关
@@ -0,0 +1,332 @@
+import os
+import csv
+import io
+import json
+import time
+import sqlite3
+import threading
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional
+
+from .answer_cache import normalize_question, only_noise_differs
+from .embedding_cache import content_hash
+from .lexical import TOKENIZER_ID, index_text, match_expression
+
+QUESTION_TYPES = ("single_choice", "multi_choice", "true_false", "subjective")
+
+
+def _normalize_options(options: Any) -> str:
+    if isinstance(options, list):
+        return "\n".join(normalize_question(str(o)) for o in options if str(o).strip())
+    return normalize_question(str(options)) if options else ""
+
+
+class QuestionBank:
+    """持久化的题库：解过的题目、选项和答案存放在 SQLite 中，题干建有 FTS5 倒排索引。
+
+    - lookup 先按 规范化题干 + 选项 的哈希精确匹配，未命中时用 FTS5 召回候选，
+      再以字符相似度(difflib)不低于 fuzzy_ratio、选项相同且差异部分只是OCR噪声
+      （不含否定词、数字和字母）作为模糊匹配；
+    - 导入的题目（source=import）视为标准答案，不会被LLM的答案覆盖，也不随知识库变化失效；
+    - LLM 给出的答案置信度不低于 min_confidence 时才记入题库（learn=False 时不记录），
+      连同检索到的上下文和当时的知识库版本一起保存。添加新文档不影响已记录的答案；
+      文档被替换或删除时，只清除上下文来自该文档的答案（见 invalidate_documents）。
+    """
+
+    def __init__(self, db_path: str, fuzzy_ratio: Optional[float] = None,
+                 min_confidence: Optional[float] = None, learn: Optional[bool] = None):
+        self.db_path = db_path
+        self.fuzzy_ratio = fuzzy_ratio if fuzzy_ratio is not None else float(
+            os.getenv("QUESTION_BANK_FUZZY_RATIO", "0.9"))
+        self.min_confidence = min_confidence if min_confidence is not None else float(
+            os.getenv("QUESTION_BANK_MIN_CONFIDENCE", "0.5"))
+        # 关闭后只使用导入的题目，不记录LLM的答案
+        self.learn = learn if learn is not None else os.getenv("QUESTION_BANK_LEARN", "true").lower() == "true"
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                qhash TEXT NOT NULL UNIQUE,
+                question TEXT NOT NULL,
+                options TEXT,
+                qtype TEXT,
+                answer TEXT NOT NULL,
+                source TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                kb_version INTEGER,
+                contexts TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(tokens, tokenize = 'unicode61');
+            CREATE TABLE IF NOT EXISTS question_bank_meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(questions)")}
+        for column, decl in (("kb_version", "INTEGER"), ("contexts", "TEXT")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE questions ADD COLUMN {column} {decl}")
+        self._conn.commit()
+        self._kb_version: Optional[int] = None
+        row = self._conn.execute("SELECT value FROM question_bank_meta WHERE name = 'lexical_tokenizer'").fetchone()
+        if row is None or int(row[0]) != TOKENIZER_ID:
+            self._rebuild_fts()
+
+    def _rebuild_fts(self):
+        """分词器变化（如新安装了 jieba）时重建题干倒排索引"""
+        with self._lock:
+            self._conn.execute("DELETE FROM questions_fts")
+            rows = self._conn.execute("SELECT id, question FROM questions").fetchall()
+            self._conn.executemany("INSERT INTO questions_fts (rowid, tokens) VALUES (?, ?)",
+                                   [(qid, index_text(q)) for qid, q in rows])
+            self._conn.execute("INSERT OR REPLACE INTO question_bank_meta VALUES ('lexical_tokenizer', ?)",
+                               (str(TOKENIZER_ID),))
+            self._conn.commit()
+
+    def _sync_version(self, kb_version: int) -> bool:
+        """记录见到的最新知识库版本；版本落后（解题期间知识库已更新）时返回 False。调用方已持有锁"""
+        if self._kb_version is not None and kb_version < self._kb_version:
+            return False
+        self._kb_version = kb_version
+        return True
+
+    def invalidate_documents(self, doc_ids: Iterable[str], kb_version: int) -> int:
+        """文档被替换或删除后（知识库版本已前进到 kb_version），清除上下文来自这些文档的
+        LLM答案，返回清除的题目数。导入的题目和其他答案保留"""
+        doc_ids = set(doc_ids)
+        with self._lock:
+            self._sync_version(kb_version)
+            rows = self._conn.execute(
+                "SELECT id, contexts FROM questions WHERE source = 'llm' AND contexts IS NOT NULL").fetchall()
+            stale = [(qid,) for qid, contexts in rows
+                     if any(c.get("doc_id") in doc_ids for c in json.loads(contexts))]
+            self._conn.executemany("DELETE FROM questions WHERE id = ?", stale)
+            self._conn.executemany("DELETE FROM questions_fts WHERE rowid = ?", stale)
+            self._conn.commit()
+        return len(stale)
+
+    @staticmethod
+    def _hash(question: str, options: Any) -> str:
+        return content_hash(normalize_question(question) + "\n" + _normalize_options(options))
+
+    # ---- 查询 ----
+
+    def lookup(self, question: str, options: Any = None, qtype: Optional[str] = None,
+               kb_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """返回匹配的题目 {id, question, options, qtype, answer, contexts, source, match, similarity}，
+        未命中返回 None。qtype 为具体题型时只匹配同一题型的题目；不给出 kb_version（或版本已落后）
+        时只匹配导入的题目。"""
+        if not question or not question.strip():
+            return None
+        typed = qtype if qtype in QUESTION_TYPES else None
+        with self._lock:
+            learned = kb_version is not None and self._sync_version(kb_version)
+            valid = "1" if learned else "q.source = 'import'"
+            row = self._conn.execute(f"SELECT q.* FROM questions q WHERE q.qhash = ? AND {valid}",
+                                     (self._hash(question, options),)).fetchone()
+            if row is not None and (typed is None or row[4] in (None, typed)):
+                return self._hit(row, "exact", 1.0)
+
+            expression = match_expression(question)
+            if not expression or self.fuzzy_ratio >= 1:
+                return None
+            rows = self._conn.execute(
+                "SELECT q.* FROM questions_fts f JOIN questions q ON q.id = f.rowid "
+                f"WHERE questions_fts MATCH ? AND {valid} ORDER BY bm25(questions_fts) LIMIT 10",
+                (expression,)
+            ).fetchall()
+
+            target, target_options = normalize_question(question), _normalize_options(options)
+            best, best_ratio = None, 0.0
+            for candidate in rows:
+                if typed is not None and candidate[4] not in (None, typed):
+                    continue
+                if _normalize_options(json.loads(candidate[3]) if candidate[3] else None) != target_options:
+                    continue
+                stem = normalize_question(candidate[2])
+                ratio = SequenceMatcher(None, target, stem).ratio()
+                if ratio > best_ratio and only_noise_differs(target, stem):
+                    best, best_ratio = candidate, ratio
+            if best is not None and best_ratio >= self.fuzzy_ratio:
+                return self._hit(best, "fuzzy", round(best_ratio, 4))
+        return None
+
+    def _hit(self, row: tuple, match: str, similarity: float) -> Dict[str, Any]:
+        # 调用方已持有锁
+        self._conn.execute("UPDATE questions SET hits = hits + 1 WHERE id = ?", (row[0],))
+        self._conn.commit()
+        return {**self._to_dict(row), "match": match, "similarity": similarity}
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        expression = match_expression(query)
+        if not expression:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT q.* FROM questions_fts f JOIN questions q ON q.id = f.rowid "
+                "WHERE questions_fts MATCH ? ORDER BY bm25(questions_fts) LIMIT ?", (expression, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def get(self, question_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM questions WHERE id = ?", (question_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT source, COUNT(*), COALESCE(SUM(hits), 0) FROM questions "
+                                      "GROUP BY source").fetchall()
+        return {
+            "total": sum(r[1] for r in rows),
+            "by_source": {r[0]: r[1] for r in rows},
+            "hits": sum(r[2] for r in rows),
+            "kb_version": self._kb_version,
+        }
+
+    # ---- 写入 ----
+
+    def _upsert(self, question: str, options: Any, qtype: Optional[str], answer: Dict[str, Any],
+                source: str, kb_version: Optional[int] = None, contexts: Optional[List[Dict]] = None) -> str:
+        """写入一道题，返回 "inserted" / "updated" / "skipped"。调用方已持有锁，由调用方提交"""
+        qhash = self._hash(question, options)
+        now = time.time()
+        existing = self._conn.execute("SELECT id, source FROM questions WHERE qhash = ?", (qhash,)).fetchone()
+        options_json = json.dumps(options, ensure_ascii=False) if options else None
+        answer_json = json.dumps(answer, ensure_ascii=False)
+        contexts_json = json.dumps(contexts, ensure_ascii=False, default=str) if contexts else None
+        if existing is None:
+            cursor = self._conn.execute(
+                "INSERT INTO questions (qhash, question, options, qtype, answer, source, created_at, updated_at, "
+                "kb_version, contexts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (qhash, question.strip(), options_json, qtype, answer_json, source, now, now,
+                 kb_version, contexts_json))
+            self._conn.execute("INSERT INTO questions_fts (rowid, tokens) VALUES (?, ?)",
+                               (cursor.lastrowid, index_text(question)))
+            return "inserted"
+        # 导入的标准答案不被LLM的答案覆盖
+        if existing[1] == "import" and source != "import":
+            return "skipped"
+        self._conn.execute("UPDATE questions SET qtype = ?, answer = ?, source = ?, updated_at = ?, kb_version = ?, "
+                           "contexts = ? WHERE id = ?",
+                           (qtype, answer_json, source, now, kb_version, contexts_json, existing[0]))
+        return "updated"
+
+    def record(self, question: str, options: Any, qtype: Optional[str], answer: Dict[str, Any],
+               kb_version: int, contexts: Optional[List[Dict]] = None) -> bool:
+        """记录LLM在知识库版本 kb_version 下解出的题目；置信度低于 min_confidence 的答案，
+        以及解题期间知识库已更新的答案不记录"""
+        try:
+            confidence = float(answer.get("confidence", 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if not self.learn or not question.strip() or confidence < self.min_confidence:
+            return False
+        qtype = qtype if qtype in QUESTION_TYPES else answer.get("type")
+        with self._lock:
+            if not self._sync_version(kb_version):
+                return False
+            status = self._upsert(question, options, qtype if qtype in QUESTION_TYPES else None, answer, "llm",
+                                  kb_version, contexts)
+            self._conn.commit()
+        return status != "skipped"
+
+    def import_questions(self, items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """批量导入题目，每项为 {question, options?, type?, answer, rationale?}；
+        answer 为字符串、选项字母列表或完整的答案对象。在一个事务内完成。"""
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        errors = []
+        with self._lock:
+            try:
+                for n, item in enumerate(items, 1):
+                    error = _invalid_item(item)
+                    if error:
+                        errors.append(f"#{n}: {error}")
+                        continue
+                    question = item["question"].strip()
+                    answer = item["answer"]
+                    qtype = item.get("type") if item.get("type") in QUESTION_TYPES else None
+                    if not isinstance(answer, dict):
+                        answer = {"type": qtype or "subjective", "final_answer": answer, "confidence": 1.0,
+                                  "brief_rationale": item.get("rationale") or "题库答案", "supporting_sources": []}
+                    counts[self._upsert(question, item.get("options") or None, qtype, answer, "import")] += 1
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return {**counts, "errors": errors}
+
+    def delete(self, question_id: int) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM questions WHERE id = ?", (question_id,)).rowcount
+            self._conn.execute("DELETE FROM questions_fts WHERE rowid = ?", (question_id,))
+            self._conn.commit()
+        return bool(deleted)
+
+    def _to_dict(self, row: tuple) -> Dict[str, Any]:
+        qid, _, question, options, qtype, answer, source, hits, created_at, updated_at, kb_version, contexts = row
+        return {
+            "id": qid,
+            "question": question,
+            "options": json.loads(options) if options else None,
+            "qtype": qtype,
+            "answer": json.loads(answer),
+            "contexts": json.loads(contexts) if contexts else [],
+            "kb_version": kb_version,
+            "source": source,
+            "hits": hits,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+
+def _invalid_item(item: Any) -> Optional[str]:
+    """检查一条导入的题目，返回错误说明；格式正确时返回 None"""
+    if not isinstance(item, dict):
+        return "expected an object"
+    if not isinstance(item.get("question"), str) or not item["question"].strip():
+        return "question must be a non-empty string"
+    answer = item.get("answer")
+    if answer in (None, "", []) or not isinstance(answer, (str, int, float, list, dict)):
+        return "answer is required (string, list of option letters or answer object)"
+    options = item.get("options")
+    if options is not None and not isinstance(options, str) and not (
+            isinstance(options, list) and all(isinstance(o, str) for o in options)):
+        return "options must be a string or a list of strings"
+    if item.get("type") and item["type"] not in QUESTION_TYPES:
+        return f"type must be one of {', '.join(QUESTION_TYPES)}"
+    return None
+
+
+def parse_question_file(filename: str, data: bytes) -> List[Dict[str, Any]]:
+    """解析题库导入文件：JSON 数组、JSONL，或带 question,options,type,answer 列的 CSV
+    （CSV 中的多个选项用 | 分隔，多选题答案如 "A,C"）"""
+    text = data.decode("utf-8-sig")
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".json":
+        items = json.loads(text)
+        if isinstance(items, dict):
+            items = items.get("questions")
+        if not isinstance(items, list):
+            raise ValueError('expected a JSON array of questions or {"questions": [...]}')
+        return items
+    if ext == ".jsonl":
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if ext == ".csv":
+        items = []
+        for row in csv.DictReader(io.StringIO(text)):
+            options = [o.strip() for o in (row.get("options") or "").split("|") if o.strip()]
+            answer = (row.get("answer") or "").strip()
+            if row.get("type") == "multi_choice":
+                answer = [a.strip() for a in answer.replace("，", ",").split(",") if a.strip()]
+            items.append({"question": row.get("question"), "options": options or None,
+                          "type": row.get("type"), "answer": answer, "rationale": row.get("rationale")})
+        return items
+    raise ValueError(f"Unsupported question file type: {ext} (use .json, .jsonl or .csv)")
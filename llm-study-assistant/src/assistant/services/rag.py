@@ -1,19 +1,33 @@
 import os
 import shutil
 import uuid
-from typing import List, Dict, Any
+import time
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Any, AsyncIterator, Callable, Deque, Iterator, Optional, Tuple
 
 from fastapi import UploadFile
 
-from .store import VectorStore
-from .llm import LLMClient
+from .store import get_store
+from .reranker import Reranker
+from .model_registry import registry
+from .answer_cache import AnswerCache, normalize_question
+from .question_bank import QuestionBank
+from .llm import LLMClient, parse_json_content
 from .prompts import (
     SYSTEM_PROMPT, CLASSIFIER_PROMPT, VIDEO_CLASSIFIER_PROMPT, SOLVER_PREFIX,
-    SOLVER_SINGLE, SOLVER_MULTI, SOLVER_TF, SOLVER_SUBJ,
-    check_compliance, get_compliance_response
+    SOLVER_SINGLE, SOLVER_MULTI, SOLVER_TF, SOLVER_SUBJ, SOLVER_AUTO, QUESTION_TYPES,
+    check_compliance, get_compliance_response, rule_classify
 )
 from .parsers import read_any, chunk_text
-from .video_processing import extract_text_from_video, parse_ocr_text_to_qa
+from .video_processing import (
+    extract_text_from_video, iter_text_from_video, parse_ocr_text_to_qa, split_complete_questions
+)
+
+logger = logging.getLogger(__name__)
 
 def make_sources(objs: List[Dict]) -> str:
     """Formats retrieved chunks into a context string for the model."""
@@ -26,67 +40,186 @@ def make_sources(objs: List[Dict]) -> str:
         lines.append(line)
     return "\n".join(lines)
 
+def _failed_answer(reason: str) -> Dict:
+    """A solve() result for a question that could not be answered."""
+    return {"raw": {"final_answer": "Failed to solve question.", "confidence": 0.0, "brief_rationale": reason},
+            "contexts": []}
+
+
+class _QuestionSolver:
+    """Solves questions on a bounded thread pool and hands results back in submission order.
+
+    At most `concurrency` questions are in flight, so wall-clock time is roughly
+    max(latency) * ceil(n / concurrency). A question that has been running longer than
+    `timeout` seconds gets a failure result; its worker thread is abandoned, not killed.
+    """
+
+    def __init__(self, answer: Callable[[Dict], Dict], concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.answer = answer
+        self.concurrency = concurrency or int(os.getenv("VIDEO_SOLVE_CONCURRENCY", "4"))
+        self.timeout = timeout or float(os.getenv("VIDEO_SOLVE_TIMEOUT", "120"))
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="video-solve")
+        self._pending: Deque[Tuple[Future, Dict, List[float]]] = deque()
+
+    def submit(self, qa: Dict):
+        started: List[float] = []
+
+        def run():
+            started.append(time.monotonic())
+            return self.answer(qa)
+
+        self._pending.append((self._pool.submit(run), qa, started))
+
+    def ready(self, block: bool = False) -> Iterator[Tuple[Dict, Dict]]:
+        """Yields (qa, result) for finished questions in order; with block=True waits for all of them."""
+        while self._pending:
+            future, qa, started = self._pending[0]
+            # The timeout counts from when the question started running, not from when it was queued
+            expired = bool(started) and time.monotonic() - started[0] >= self.timeout
+            if not future.done() and not expired:
+                if not block:
+                    return
+                remaining = self.timeout - (time.monotonic() - started[0]) if started else self.timeout
+                try:
+                    future.result(timeout=min(max(remaining, 0.0), 0.5))
+                except FutureTimeout:
+                    continue
+                except Exception:
+                    pass
+            self._pending.popleft()
+            yield qa, self._result(future, qa)
+
+    def _result(self, future: Future, qa: Dict) -> Dict:
+        if not future.done():
+            future.cancel()
+            logger.warning(f"Solving timed out after {self.timeout:.0f}s: {qa['question'][:50]}")
+            return _failed_answer(f"Timed out after {self.timeout:.0f}s")
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Solving failed: {qa['question'][:50]}: {e}")
+            return _failed_answer(f"Error: {e}")
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
 class RAGPipeline:
     """Handles the entire RAG process from document ingestion to question answering."""
 
     def __init__(self):
         data_dir = os.getenv("DATA_DIR", "./data")
-        self.store = VectorStore(data_dir)
+        # 所有管线共享同一数据目录的向量存储和Embedding模型
+        self.store = get_store(data_dir)
+        self.reranker = Reranker()
         self.llm = LLMClient()
+        self.rule_classifier = os.getenv("RULE_CLASSIFIER", "true").lower() == "true"
+        self.video_solve_mode = os.getenv("VIDEO_SOLVE_MODE", "fused").lower()
+        self.answer_cache = AnswerCache()
+        self.question_bank = None
+        if os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true":
+            self.question_bank = QuestionBank(
+                os.getenv("QUESTION_BANK_DB", os.path.join(data_dir, "question_bank.db")))
+
+    def warm_up(self):
+        """Starts loading the embedding (and, if enabled, rerank) models in a background thread."""
+        cross_encoders = [(self.reranker.model_name, self.reranker.max_length)] if self.reranker.enabled else []
+        return registry.warm_up([self.store.model_name], cross_encoders)
 
     def get_status(self) -> Dict[str, Any]:
-        """Gets the status of the RAG components."""
-        # Actively test the connection before getting info
-        self.llm.test_connection(max_retries=1)
-        
+        """Gets the status of the RAG components.
+
+        Does not contact the LLM: llm_available is the result of the last request or health probe.
+        """
         llm_info = self.llm.get_model_info()
         store_stats = self.store.get_stats()
         return {
             "llm_available": llm_info["available"],
             "llm_model": llm_info["model"],
+            "llm_circuit": llm_info["circuit"],
+            "llm_requests": llm_info["requests"],
             "embedding_available": store_stats["embedding_available"],
+            "embedding_ready": store_stats["embedding_ready"],
             "embedding_model": os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5"),
             "index_available": store_stats["index_vectors"] > 0,
         }
 
-    def add_files(self, files: List[UploadFile], upload_dir: str) -> Dict[str, Any]:
-        """Processes uploaded files and adds them to the vector store."""
-        added_chunks = 0
-        saved_files = []
-        errors = []
+    def _read_chunks(self, path: str) -> List[str]:
+        """Reads a saved upload and splits it into chunks."""
+        text_content = read_any(path)
+        if not text_content.strip():
+            raise ValueError("File is empty")
 
+        chunk_size = int(os.getenv("CHUNK_SIZE", "500"))
+        overlap = int(os.getenv("CHUNK_OVERLAP", "100"))
+        chunks = chunk_text(text_content, chunk_size=chunk_size, overlap=overlap)
+        if not chunks:
+            raise ValueError("Could not chunk document")
+        return chunks
+
+    def stage_uploads(self, files: List[UploadFile], staging_dir: str) -> List[Dict[str, str]]:
+        """Spools uploaded files to staging_dir, returning {filename, path, doc_id} for each."""
+        staged = []
+        os.makedirs(staging_dir, exist_ok=True)
         for file in files:
             if not file.filename:
                 continue
-            try:
-                ext = os.path.splitext(file.filename)[1].lower()
-                doc_id = f"{uuid.uuid4().hex}{ext}"
-                dst_path = os.path.join(upload_dir, doc_id)
+            ext = os.path.splitext(file.filename)[1].lower()
+            tmp_path = os.path.join(staging_dir, f".upload-{uuid.uuid4().hex}{ext}")
+            # The doc_id is derived from the file content, so re-imports of the same file are detected
+            digest = hashlib.sha256()
+            with open(tmp_path, "wb") as f:
+                for block in iter(lambda: file.file.read(1 << 20), b""):
+                    digest.update(block)
+                    f.write(block)
+            staged.append({"filename": file.filename, "path": tmp_path, "doc_id": f"{digest.hexdigest()[:32]}{ext}"})
+        return staged
 
-                with open(dst_path, "wb") as f:
-                    shutil.copyfileobj(file.file, f)
+    def add_staged_files(self, staged: List[Dict[str, str]], upload_dir: str,
+                         progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Indexes files spooled by stage_uploads and moves them into upload_dir.
 
-                text_content = read_any(dst_path)
-                if not text_content.strip():
-                    errors.append(f"{file.filename}: File is empty")
-                    continue
+        `progress`, if given, is called after each file and may raise to stop early;
+        staged files that were not processed are removed either way.
+        """
+        added_chunks = 0
+        duplicates = 0
+        saved_files = []
+        errors = []
 
-                chunk_size = int(os.getenv("CHUNK_SIZE", "500"))
-                overlap = int(os.getenv("CHUNK_OVERLAP", "100"))
-                chunks = chunk_text(text_content, chunk_size=chunk_size, overlap=overlap)
+        try:
+            for n, item in enumerate(staged, 1):
+                filename, tmp_path, doc_id = item["filename"], item["path"], item["doc_id"]
+                try:
+                    if self.store.has_document(doc_id):
+                        duplicates += 1
+                        saved_files.append({"filename": filename, "doc_id": doc_id, "chunks": 0, "duplicate": True})
+                        continue
 
-                if not chunks:
-                    errors.append(f"{file.filename}: Could not chunk document")
-                    continue
+                    dst_path = os.path.join(upload_dir, doc_id)
+                    os.replace(tmp_path, dst_path)
 
-                added = self.store.add(doc_id, chunks)
-                added_chunks += added
-                saved_files.append({"filename": file.filename, "doc_id": doc_id, "chunks": added})
+                    chunks = self._read_chunks(dst_path)
+                    added = self.store.add(doc_id, chunks)
+                    added_chunks += added
+                    saved_files.append({"filename": filename, "doc_id": doc_id, "chunks": added})
 
-            except Exception as e:
-                errors.append(f"{file.filename}: {str(e)}")
+                except Exception as e:
+                    errors.append(f"{filename}: {str(e)}")
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                if progress:
+                    progress({"files_done": n, "files_total": len(staged), "added_chunks": added_chunks})
+        finally:
+            for item in staged:
+                if os.path.exists(item["path"]):
+                    os.remove(item["path"])
 
         message = f"Successfully processed {len(saved_files)} files, adding {added_chunks} chunks."
+        if duplicates:
+            message += f" Skipped {duplicates} files already in the knowledge base."
         if errors:
             message += f"\nErrors: {'; '.join(errors)}"
 
@@ -96,11 +229,80 @@ class RAGPipeline:
             "message": message
         }
 
+    def add_files(self, files: List[UploadFile], upload_dir: str) -> Dict[str, Any]:
+        """Processes uploaded files and adds them to the vector store."""
+        return self.add_staged_files(self.stage_uploads(files, upload_dir), upload_dir)
+
+    def replace_file(self, doc_id: str, file: UploadFile, upload_dir: str) -> Dict[str, Any]:
+        """Replaces an indexed document with a new version, re-embedding only changed chunks."""
+        if not self.store.has_document(doc_id):
+            raise KeyError(doc_id)
+
+        base, ext = os.path.splitext(doc_id)
+        # Keep the original extension so read_any picks the same parser
+        tmp_path = os.path.join(upload_dir, f"{base}.new{ext}")
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(file.file, f)
+
+        try:
+            chunks = self._read_chunks(tmp_path)
+            stats = self.store.replace_document(doc_id, chunks)
+            os.replace(tmp_path, os.path.join(upload_dir, doc_id))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._forget_learned_answers(doc_id)
+
+        return {"filename": file.filename, "doc_id": doc_id, **stats}
+
+    def _forget_learned_answers(self, doc_id: str):
+        """Drops question-bank answers that were solved with contexts from a replaced or deleted document."""
+        if self.question_bank is None:
+            return
+        try:
+            removed = self.question_bank.invalidate_documents([doc_id], self.store.version)
+            if removed:
+                logger.info(f"Question bank: dropped {removed} answers based on {doc_id}")
+        except Exception as e:
+            logger.warning(f"Question bank: could not invalidate answers for {doc_id}: {e}")
+
+    def delete_document(self, doc_id: str, upload_dir: str) -> int:
+        """Removes a document from the vector store and deletes its uploaded file."""
+        deleted = self.store.delete_document(doc_id)
+        if deleted:
+            self._forget_learned_answers(doc_id)
+            path = os.path.join(upload_dir, doc_id)
+            if os.path.isfile(path):
+                os.remove(path)
+        return deleted
+
+    def list_documents(self) -> List[Dict]:
+        """Lists indexed documents."""
+        return self.store.list_documents()
+
+    def retrieve(self, question: str, top_k: int = 5, min_score: Optional[float] = None,
+                 mode: Optional[str] = None, rerank: Optional[bool] = None) -> List[Dict]:
+        """Retrieves contexts; with reranking, a larger candidate set is rescored by the cross-encoder."""
+        if rerank is None:
+            rerank = self.reranker.enabled
+        if not rerank or not self.reranker.available:
+            return self.store.search(question, top_k=top_k, min_score=min_score, mode=mode)
+
+        candidates = self.store.search(question, top_k=self.reranker.candidate_count(top_k),
+                                       min_score=min_score, mode=mode)
+        return self.reranker.rerank(question, candidates, top_k)
+
     def classify(self, question: str, options: List[str] = None, is_video_content: bool = False) -> str:
         """Classifies the question type."""
         if check_compliance(question):
             return "compliance_check"
 
+        # Obvious cases (A/B/C/D options, 对/错 options) don't need an LLM round-trip
+        if self.rule_classifier:
+            qtype = rule_classify(question, options)
+            if qtype:
+                return qtype
+
         prompt_template = VIDEO_CLASSIFIER_PROMPT if is_video_content else CLASSIFIER_PROMPT
         user_content = f"Question: {question}\nOptions: {options or 'None'}"
         messages = [
@@ -109,16 +311,11 @@ class RAGPipeline:
         ]
         response = self.llm.chat(messages, max_tokens=200, json_mode=True)
 
-        if isinstance(response, dict) and response.get("type") in {"single_choice", "multi_choice", "true_false", "subjective"}:
+        if isinstance(response, dict) and response.get("type") in QUESTION_TYPES:
             return response["type"]
         return "subjective"
 
-    def solve(self, qtype: str, question: str, options: List[str] = None, top_k: int = 5) -> Dict:
-        """Solves a question using the RAG pipeline."""
-        if qtype == "compliance_check" or check_compliance(question):
-            return {"raw": get_compliance_response(), "contexts": []}
-
-        contexts = self.store.search(question, top_k=top_k)
+    def _solve_messages(self, qtype: Optional[str], question: str, options, contexts: List[Dict]) -> List[Dict]:
         contexts_text = make_sources(contexts)
 
         type_prompts = {
@@ -127,26 +324,177 @@ class RAGPipeline:
             "true_false": SOLVER_TF,
             "subjective": SOLVER_SUBJ,
         }
-        solver_prompt = type_prompts.get(qtype, SOLVER_SUBJ)
+        solver_prompt = SOLVER_AUTO if qtype is None else type_prompts.get(qtype, SOLVER_SUBJ)
 
-        messages = [
+        return [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": f"{SOLVER_PREFIX}\n\nContexts:\n{contexts_text}\n\nQuestion:\n{question}\n\nOptions:\n{options or 'None'}\n\n{solver_prompt}"}
         ]
-        result = self.llm.chat(messages, max_tokens=800, json_mode=True)
 
+    def _resolve_qtype(self, qtype: Optional[str], question: str, options) -> Optional[str]:
+        """Maps "auto" to a rule-based type, or None to let the solver prompt detect it."""
+        if qtype not in (None, "auto"):
+            return qtype
+        return rule_classify(question, options) if self.rule_classifier else None
+
+    def _cached_answer(self, qtype: Optional[str], question: str, options,
+                       params: Dict[str, Any]) -> Tuple[Optional[Dict], Callable[[Dict], None]]:
+        """Looks the question up in the question bank, then in the answer cache.
+
+        Returns (cached result or None, store) where store(result) caches a freshly solved answer
+        under the knowledge-base version seen at lookup time and records it in the question bank;
+        failed answers are not cached.
+        """
+        version = self.store.version
+        if self.question_bank is not None:
+            try:
+                entry = self.question_bank.lookup(question, options, qtype, kb_version=version)
+            except Exception as e:
+                logger.warning(f"Question bank lookup failed: {e}")
+                entry = None
+            if entry:
+                return {"raw": entry["answer"], "contexts": entry["contexts"], "cache": "question_bank",
+                        "question_bank": {"id": entry["id"], "match": entry["match"],
+                                          "similarity": entry["similarity"]}}, lambda result: None
+
+        key, scope = AnswerCache.make_key(question, options, qtype, params)
+        stem = normalize_question(question)
+        vector = None
+        if self.answer_cache.semantic:
+            try:
+                vector = self.store.encode_query(question)
+            except Exception as e:
+                logger.warning(f"Answer cache: could not embed question: {e}")
+        hit = self.answer_cache.get(key, scope, stem, vector, version)
+        if hit:
+            result, tier = hit
+            result["cache"] = tier
+            return result, lambda result: None
+
+        def store(result: Dict):
+            self.answer_cache.put(key, scope, stem, vector, version, result)
+            if self.question_bank is not None:
+                try:
+                    self.question_bank.record(question, options, qtype, result["raw"], version, result["contexts"])
+                except Exception as e:
+                    logger.warning(f"Question bank: could not record answer: {e}")
+        return None, store
+
+    @staticmethod
+    def _answer_ok(result) -> bool:
+        return isinstance(result, dict) and "error" not in result
+
+    @staticmethod
+    def _check_result(qtype: Optional[str], result) -> Dict:
         if not isinstance(result, dict) or "error" in result:
+            raw_content = result.get("raw_content", "") if isinstance(result, dict) else str(result)
             result = {
                 "final_answer": "Failed to parse LLM response.",
                 "confidence": 0.1,
-                "brief_rationale": f"LLM output format error: {result.get('raw_content', '')[:100]}",
+                "brief_rationale": f"LLM output format error: {(raw_content or '')[:100]}",
             }
+        elif qtype is None and result.get("type") not in QUESTION_TYPES:
+            result["type"] = "subjective"
+        return result
+
+    def solve(self, qtype: Optional[str], question: str, options: List[str] = None, top_k: int = 5,
+              min_score: Optional[float] = None, mode: Optional[str] = None,
+              rerank: Optional[bool] = None) -> Dict:
+        """Solves a question using the RAG pipeline.
+
+        With qtype=None or "auto" the model detects the question type and answers in the same
+        call (SOLVER_AUTO); the detected type is returned in the result's "type" field.
+        """
+        if qtype == "compliance_check" or check_compliance(question):
+            return {"raw": get_compliance_response(), "contexts": []}
+        qtype = self._resolve_qtype(qtype, question, options)
+        cached, store = self._cached_answer(qtype, question, options,
+                                            {"top_k": top_k, "min_score": min_score, "mode": mode, "rerank": rerank})
+        if cached:
+            return cached
+
+        contexts = self.retrieve(question, top_k=top_k, min_score=min_score, mode=mode, rerank=rerank)
+        result = self.llm.chat(self._solve_messages(qtype, question, options, contexts), max_tokens=800, json_mode=True)
+        answer = {"raw": self._check_result(qtype, result), "contexts": contexts}
+        if self._answer_ok(result):
+            store(answer)
+        return answer
+
+    async def asolve(self, qtype: Optional[str], question: str, options: List[str] = None, top_k: int = 5,
+                     min_score: Optional[float] = None, mode: Optional[str] = None,
+                     rerank: Optional[bool] = None) -> Dict:
+        """Async variant of solve for use from the event loop.
+
+        Retrieval (embedding, FAISS, rerank) runs in a worker thread and the LLM call is awaited,
+        so concurrent requests overlap instead of blocking each other.
+        """
+        if qtype == "compliance_check" or check_compliance(question):
+            return {"raw": get_compliance_response(), "contexts": []}
+        qtype = self._resolve_qtype(qtype, question, options)
+        cached, store = await asyncio.to_thread(
+            self._cached_answer, qtype, question, options,
+            {"top_k": top_k, "min_score": min_score, "mode": mode, "rerank": rerank})
+        if cached:
+            return cached
+
+        contexts = await asyncio.to_thread(self.retrieve, question, top_k, min_score, mode, rerank)
+        result = await self.llm.aclient.chat(self._solve_messages(qtype, question, options, contexts),
+                                             max_tokens=800, json_mode=True)
+        answer = {"raw": self._check_result(qtype, result), "contexts": contexts}
+        if self._answer_ok(result):
+            store(answer)
+        return answer
+
+    async def asolve_stream(self, qtype: Optional[str], question: str, options: List[str] = None, top_k: int = 5,
+                            min_score: Optional[float] = None, mode: Optional[str] = None,
+                            rerank: Optional[bool] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streams a solve: a contexts event, token events as the model generates, then the parsed answer."""
+        if qtype == "compliance_check" or check_compliance(question):
+            yield {"event": "contexts", "contexts": []}
+            yield {"event": "answer", "raw": get_compliance_response()}
+            return
+        qtype = self._resolve_qtype(qtype, question, options)
+        cached, store = await asyncio.to_thread(
+            self._cached_answer, qtype, question, options,
+            {"top_k": top_k, "min_score": min_score, "mode": mode, "rerank": rerank})
+        if cached:
+            yield {"event": "contexts", "contexts": cached["contexts"]}
+            yield {"event": "answer", "raw": cached["raw"], "cache": cached["cache"]}
+            return
+
+        contexts = await asyncio.to_thread(self.retrieve, question, top_k, min_score, mode, rerank)
+        yield {"event": "contexts", "contexts": contexts}
 
-        return {"raw": result, "contexts": contexts}
+        parts: List[str] = []
+        try:
+            async for text in self.llm.aclient.stream_chat(self._solve_messages(qtype, question, options, contexts),
+                                                           max_tokens=800, json_mode=True):
+                parts.append(text)
+                yield {"event": "token", "text": text}
+        except Exception as e:
+            logger.error(f"Streaming LLM call failed: {e}")
+            yield {"event": "error", "message": f"LLM调用失败: {e}"}
+            return
+        result = parse_json_content("".join(parts))
+        answer = {"raw": self._check_result(qtype, result), "contexts": contexts}
+        if self._answer_ok(result):
+            store(answer)
+        yield {"event": "answer", "raw": answer["raw"]}
 
-    def analyze_video(self, video_path: str) -> Dict[str, Any]:
+    def _answer_video_question(self, qa: Dict) -> Dict:
+        """Classifies and solves one question parsed from video OCR text.
+
+        The rule-based classifier handles obvious question types; otherwise "fused" mode detects
+        the type and answers in a single LLM call, "two_step" mode uses a separate classify call.
+        """
+        qtype = rule_classify(qa["question"], qa.get("options")) if self.rule_classifier else None
+        if qtype is None and self.video_solve_mode == "two_step":
+            qtype = self.classify(qa["question"], qa.get("options"), is_video_content=True)
+        return self.solve(qtype=qtype, question=qa["question"], options=qa.get("options"), top_k=5)
+
+    def analyze_video(self, video_path: str, roi_profile: Optional[str] = None) -> Dict[str, Any]:
         """Analyzes a video, extracts Q&A, and solves them."""
-        extracted_text = extract_text_from_video(video_path)
+        extracted_text = extract_text_from_video(video_path, profile=roi_profile)
         if not extracted_text.strip():
             return {"status": "failed", "message": "No text extracted from video", "results": []}
 
@@ -154,16 +502,18 @@ class RAGPipeline:
         if not qa_pairs:
             qa_pairs = [{"question": extracted_text.strip(), "options": None}]
 
-        analysis_results = []
-        for qa in qa_pairs:
-            qtype = self.classify(qa["question"], qa.get("options"), is_video_content=True)
-            result = self.solve(qtype=qtype, question=qa["question"], options=qa.get("options"), top_k=5)
-            analysis_results.append({
-                "question": qa["question"],
-                "options": qa.get("options"),
-                "answer": result
-            })
-        
+        # Questions are solved concurrently; results keep the order of the questions in the video
+        solver = _QuestionSolver(self._answer_video_question)
+        try:
+            for qa in qa_pairs:
+                solver.submit(qa)
+            analysis_results = [
+                {"question": qa["question"], "options": qa.get("options"), "answer": result}
+                for qa, result in solver.ready(block=True)
+            ]
+        finally:
+            solver.close()
+
         # Reformat for API response
         all_contexts = []
         raw_answers = []
@@ -183,6 +533,80 @@ class RAGPipeline:
             "all_contexts": all_contexts
         }
 
+    def analyze_video_stream(self, video_path: str, roi_profile: Optional[str] = None,
+                             progress_interval: float = 1.0) -> Iterator[Dict[str, Any]]:
+        """Streaming variant of analyze_video that yields events as soon as they are available.
+
+        Events: started, progress (OCR counters, throttled to progress_interval seconds),
+        question (a parsed question), answer (its solution and contexts), done or error.
+        A question is queued for solving as soon as the next question has been seen in the
+        OCR text, since only then is its option block known to be complete; the last one is
+        queued once OCR has finished. Questions are solved concurrently while OCR continues,
+        and answers are emitted in question order.
+        """
+        start = time.perf_counter()
+        yield {"event": "started", "filename": os.path.basename(video_path)}
+
+        # OCR text is kept only until the first question is found, for the whole-text fallback
+        texts: List[str] = []
+        tail = ""
+        emitted = set()
+        counter = 0
+        answered = 0
+        last_progress = 0.0
+        solver = _QuestionSolver(self._answer_video_question)
+
+        def submit(qa_pairs: List[Dict]) -> Iterator[Dict[str, Any]]:
+            nonlocal counter
+            for qa in qa_pairs:
+                key = (qa["question"], qa.get("options"))
+                if key in emitted:
+                    continue
+                emitted.add(key)
+                counter += 1
+                yield {"event": "question", "index": counter, "question": qa["question"], "options": qa.get("options")}
+                solver.submit(qa)
+
+        def answers(block: bool = False) -> Iterator[Dict[str, Any]]:
+            nonlocal answered
+            for qa, result in solver.ready(block):
+                answered += 1
+                yield {"event": "answer", "index": answered, "question": qa["question"], "options": qa.get("options"),
+                       "answer": result["raw"], "contexts": result["contexts"]}
+
+        try:
+            for item in iter_text_from_video(video_path, profile=roi_profile):
+                yield from answers()
+                if item["type"] == "progress":
+                    now = time.perf_counter()
+                    if now - last_progress >= progress_interval:
+                        last_progress = now
+                        yield {"event": "progress", **{k: v for k, v in item.items() if k != "type"},
+                               "questions_found": counter}
+                    continue
+                if not counter:
+                    texts.append(item["text"])
+                # Only the unfinished tail is re-parsed together with the new frame's text
+                complete, tail = split_complete_questions(f"{tail}\n{item['text']}" if tail else item["text"])
+                yield from submit(complete)
+
+            if counter:
+                yield from submit(split_complete_questions(tail, final=True)[0])
+            else:
+                full_text = "\n".join(texts)
+                if not full_text.strip():
+                    yield {"event": "error", "message": "No text extracted from video"}
+                    return
+                # The fallback (whole text as a single question) is only meaningful at the end
+                yield from submit(parse_ocr_text_to_qa(full_text))
+            yield from answers(block=True)
+            yield {"event": "done", "questions": counter, "elapsed": round(time.perf_counter() - start, 2)}
+        except Exception as e:
+            yield {"event": "error", "message": str(e)}
+        finally:
+            solver.close()
+
     def get_knowledge_stats(self) -> Dict:
         """Gets knowledge base statistics."""
-        return self.store.get_stats()
\ No newline at end of file
+        return {**self.store.get_stats(), "kb_version": self.store.version, "answer_cache": self.answer_cache.stats(),
+                "question_bank": self.question_bank.stats() if self.question_bank is not None else None}
\ No newline at end of file
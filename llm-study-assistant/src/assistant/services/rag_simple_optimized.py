@@ -5,7 +5,7 @@ from typing import List, Dict, Any
 
 from fastapi import UploadFile
 
-from .store import VectorStore
+from .store import get_store
 from .llm import LLMClient
 from .prompts_simple_optimized import (
     SYSTEM_PROMPT, CLASSIFIER_PROMPT, VIDEO_CLASSIFIER_PROMPT, SOLVER_PREFIX,
@@ -31,7 +31,8 @@ class SimpleOptimizedRAGPipeline:
 
     def __init__(self):
         data_dir = os.getenv("DATA_DIR", "./data")
-        self.store = VectorStore(data_dir)
+        # 所有管线共享同一数据目录的向量存储和Embedding模型
+        self.store = get_store(data_dir)
         self.llm = LLMClient()
 
     def get_status(self) -> Dict[str, Any]:
@@ -45,6 +46,7 @@ class SimpleOptimizedRAGPipeline:
             "llm_available": llm_info["available"],
             "llm_model": llm_info["model"],
             "embedding_available": store_stats["embedding_available"],
+            "embedding_ready": store_stats["embedding_ready"],
             "embedding_model": os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5"),
             "index_available": store_stats["index_vectors"] > 0,
         }
@@ -0,0 +1,58 @@
+import os
+import time
+import logging
+from typing import List, Dict, Optional
+
+from .model_registry import registry, FAILED
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """交叉编码器重排序：先廉价地召回 candidates 个候选，再逐批打分并保留前 top_k 个。
+
+    - 每批最多 batch_size 个 (问题, 文档块) 对，控制CPU上的单次推理开销；
+    - 超过 time_budget_ms 后不再启动新的批次，未打分的候选按原召回顺序排在已打分候选之后；
+    - 模型由进程内注册表共享，第一次使用时才加载，加载失败则自动关闭重排序。
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+        self.model_name = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-base")
+        self.candidates = int(os.getenv("RERANK_CANDIDATES", "20"))
+        self.batch_size = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+        self.time_budget_ms = int(os.getenv("RERANK_TIME_BUDGET_MS", "1500"))
+        self.max_length = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+
+    @property
+    def available(self) -> bool:
+        return registry.status("cross_encoder", self.model_name) != FAILED
+
+    def candidate_count(self, top_k: int) -> int:
+        """需要从检索阶段召回的候选数量"""
+        return max(top_k, self.candidates)
+
+    def rerank(self, query: str, candidates: List[Dict], top_k: int,
+               time_budget_ms: Optional[int] = None) -> List[Dict]:
+        """对候选重新打分并返回前 top_k 个；打分结果写入 rerank_score"""
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+        model = registry.cross_encoder(self.model_name, self.max_length)
+        if model is None:
+            return candidates[:top_k]
+
+        budget = (self.time_budget_ms if time_budget_ms is None else time_budget_ms) / 1000.0
+        start = time.perf_counter()
+        scored = []
+        for offset in range(0, len(candidates), self.batch_size):
+            if offset and time.perf_counter() - start > budget:
+                logger.warning(f"重排序超出时间预算，仅对 {offset}/{len(candidates)} 个候选打分")
+                break
+            batch = candidates[offset:offset + self.batch_size]
+            scores = model.predict([(query, c["text"]) for c in batch], batch_size=len(batch),
+                                   show_progress_bar=False)
+            for c, score in zip(batch, scores):
+                scored.append({**c, "rerank_score": float(score)})
+
+        scored.sort(key=lambda c: c["rerank_score"], reverse=True)
+        return (scored + candidates[len(scored):])[:top_k]
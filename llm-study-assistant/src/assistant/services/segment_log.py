@@ -0,0 +1,227 @@
+import os
+import re
+import json
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_PATTERN = re.compile(r"^(index|meta)-(\d+)\.(faiss|jsonl)(\.tmp)?$")
+
+
+def _fsync_file(path: str):
+    """确保文件内容已落盘"""
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: str):
+    """确保目录项(rename)已落盘，不支持的平台上忽略"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SegmentLog:
+    """向量存储的追加式持久化：快照 + 段文件 + 预写日志(journal)。
+
+    - 快照: index-<seq>.faiss / meta-<seq>.jsonl，由 manifest.json 指向；
+      旧版的 index.faiss / meta.jsonl 视为 seq=0 的快照。
+    - 段文件: segments/seg-<seq>.npy，保存一次写入的向量。
+    - journal.jsonl: 每行一条操作记录，写入并 fsync 之后才算提交。
+
+    每次写入只追加新数据，开销与新增块数成正比；快照通过临时文件 + rename
+    原子替换，崩溃后最多丢失尚未提交的那一次写入。
+    """
+
+    def __init__(self, data_dir: str, legacy_index_path: str, legacy_meta_path: str):
+        self.data_dir = data_dir
+        self.segment_dir = os.path.join(data_dir, "segments")
+        self.journal_path = os.path.join(data_dir, "journal.jsonl")
+        self.manifest_path = os.path.join(data_dir, "manifest.json")
+        self.legacy_index_path = legacy_index_path
+        self.legacy_meta_path = legacy_meta_path
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.manifest = self._read_manifest()
+        self.last_seq = self.manifest["seq"]
+        self.pending = 0
+
+    def _read_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"✗ manifest读取失败，回退到旧版快照: {e}")
+        return {"seq": 0, "index": None, "meta": None}
+
+    def snapshot_paths(self) -> Tuple[str, Optional[str]]:
+        """返回当前快照的 (索引文件, 元数据文件) 路径；元数据已迁出快照时后者为 None"""
+        if self.manifest.get("index"):
+            meta = self.manifest.get("meta")
+            return (os.path.join(self.data_dir, self.manifest["index"]),
+                    os.path.join(self.data_dir, meta) if meta else None)
+        return self.legacy_index_path, self.legacy_meta_path
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.segment_dir, name)
+
+    def replay(self) -> Iterator[Tuple[Dict, Optional[np.ndarray]]]:
+        """按提交顺序返回快照之后的 journal 记录及其向量。
+
+        残缺的尾行（写入中途崩溃）会被截断；未被任何记录引用的段文件会被清理。
+        """
+        records = []
+        referenced = set()
+        if os.path.exists(self.journal_path):
+            good_offset = 0
+            with open(self.journal_path, "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(raw.decode("utf-8"))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        break
+                    good_offset += len(raw)
+                    if record.get("segment"):
+                        referenced.add(record["segment"])
+                    if record["seq"] > self.manifest["seq"]:
+                        records.append(record)
+            if good_offset < os.path.getsize(self.journal_path):
+                print("✗ journal尾部存在未完成的写入，已截断。")
+                with open(self.journal_path, "rb+") as f:
+                    f.truncate(good_offset)
+                    os.fsync(f.fileno())
+
+        self._cleanup_orphans(referenced)
+
+        for record in records:
+            vectors = None
+            if record.get("segment"):
+                path = self._segment_path(record["segment"])
+                try:
+                    vectors = np.load(path)
+                except Exception as e:
+                    print(f"✗ 段文件 {record['segment']} 读取失败，跳过该记录: {e}")
+                    continue
+            self.last_seq = max(self.last_seq, record["seq"])
+            self.pending += 1
+            yield record, vectors
+
+    def _cleanup_orphans(self, referenced: set):
+        """删除未提交的段文件与中断的快照残留"""
+        for name in os.listdir(self.segment_dir):
+            if name not in referenced:
+                try:
+                    os.remove(self._segment_path(name))
+                except OSError:
+                    pass
+        current = {self.manifest.get("index"), self.manifest.get("meta")}
+        for name in os.listdir(self.data_dir):
+            if SNAPSHOT_PATTERN.match(name) and name not in current:
+                try:
+                    os.remove(os.path.join(self.data_dir, name))
+                except OSError:
+                    pass
+
+    def append(self, op: str, vectors: Optional[np.ndarray] = None, **payload) -> int:
+        """追加一条操作记录；journal 行落盘即视为提交，返回其序号"""
+        with self._lock:
+            seq = self.last_seq + 1
+            record = {"seq": seq, "op": op}
+            if vectors is not None:
+                name = f"seg-{seq:010d}.npy"
+                path = self._segment_path(name)
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, vectors)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(path + ".tmp", path)
+                record["segment"] = name
+            record.update(payload)
+
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.last_seq = seq
+            self.pending += 1
+            return seq
+
+    def commit_snapshot(self, seq: int, write_index: Callable[[str], None], meta: Optional[List[Dict]] = None):
+        """写入覆盖到 seq 为止的新快照，提交 manifest 后清理旧快照、journal 与段文件。
+
+        元数据保存在独立的数据库中时 meta 为 None，快照只包含索引。
+        """
+        index_name = f"index-{seq:010d}.faiss"
+        index_path = os.path.join(self.data_dir, index_name)
+        meta_name = meta_path = None
+
+        write_index(index_path + ".tmp")
+        _fsync_file(index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+
+        if meta is not None:
+            meta_name = f"meta-{seq:010d}.jsonl"
+            meta_path = os.path.join(self.data_dir, meta_name)
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                for m in meta:
+                    f.write(json.dumps(m, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(meta_path + ".tmp", meta_path)
+
+        old_index, old_meta = self.snapshot_paths()
+        manifest = {"seq": seq, "index": index_name, "meta": meta_name}
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        _fsync_dir(self.data_dir)
+
+        with self._lock:
+            self.manifest = manifest
+            dropped = self._truncate_journal(seq)
+
+        for path in (old_index, old_meta):
+            if path and path not in (index_path, meta_path) and os.path.exists(path):
+                os.remove(path)
+        for name in dropped:
+            try:
+                os.remove(self._segment_path(name))
+            except OSError:
+                pass
+
+    def _truncate_journal(self, seq: int) -> List[str]:
+        """重写 journal，仅保留 seq 之后的记录；返回可以删除的段文件名"""
+        if not os.path.exists(self.journal_path):
+            self.pending = 0
+            return []
+        kept, dropped = [], []
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["seq"] > seq:
+                    kept.append(line)
+                elif record.get("segment"):
+                    dropped.append(record["segment"])
+        with open(self.journal_path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        self.pending = len(kept)
+        return dropped
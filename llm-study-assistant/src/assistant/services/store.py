@@ -1,15 +1,29 @@
 import os
 import json
+import threading
+from collections import OrderedDict
 import numpy as np
 from typing import List, Dict, Optional
 
 try:
     import faiss
-    from sentence_transformers import SentenceTransformer
     FAISS_AVAILABLE = True
 except ImportError:
     FAISS_AVAILABLE = False
 
+from .segment_log import SegmentLog
+from .meta_store import MetaStore
+from .embedding_cache import EmbeddingCache, content_hash
+from .index_backends import (
+    IndexConfig, build_index, configure_search, has_stable_ids, index_type_of, reconstruct_ids,
+    remove_ids, search_params, uses_cosine
+)
+from .lexical import rrf_fuse
+from .model_registry import registry, FAILED, SENTENCE_TRANSFORMERS_AVAILABLE
+
+# 检索方式：向量 / BM25关键词 / 两者以RRF融合
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+
 class VectorStore:
     def __init__(self, data_dir: str, embedding_model_name: Optional[str] = None):
         self.data_dir = data_dir
@@ -17,115 +31,479 @@ class VectorStore:
         
         self.meta_path = os.path.join(self.data_dir, "meta.jsonl")
         self.index_path = os.path.join(self.data_dir, "index.faiss")
+        self.meta_db_path = os.path.join(self.data_dir, "meta.db")
         
-        self.model = None
+        self.model_name = embedding_model_name or os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+        self.embedding_cache = EmbeddingCache(os.path.join(self.data_dir, "embedding_cache.db"), self.model_name)
         self.index = None
-        self.meta = []
-        self.embedding_available = False
+        # 块元数据（正文、所属文档等）存放在 SQLite 中，检索时只按ID读取命中的块
+        self.meta = MetaStore(self.meta_db_path)
 
-        if FAISS_AVAILABLE:
-            try:
-                model_name = embedding_model_name or os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
-                self.model = SentenceTransformer(model_name)
-                self.embedding_available = True
-            except Exception as e:
-                print(f"✗ 无法加载Embedding模型: {e}")
-                self.model = None
-                self.embedding_available = False
+        # 增量写入日志：每次 add 只追加新块，累计到阈值后在后台合并为新快照
+        self.log = SegmentLog(self.data_dir, self.index_path, self.meta_path)
+        self.compact_threshold = int(os.getenv("STORE_COMPACT_SEGMENTS", "16"))
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._compact_lock = threading.Lock()
+        # 串行化删除/替换，避免并发修改同一文档；检索不受影响
+        self._write_lock = threading.Lock()
+        self.index_config = IndexConfig()
+        # 检索结果的最低余弦相似度，过滤掉弱相关的上下文
+        self.min_score = float(os.getenv("MIN_SCORE", "0.0"))
+        self.search_mode = os.getenv("SEARCH_MODE", "hybrid").lower()
+        if self.search_mode not in SEARCH_MODES:
+            print(f"✗ 未知的检索方式 {self.search_mode}，使用 hybrid。")
+            self.search_mode = "hybrid"
+        self.rrf_k = int(os.getenv("RRF_K", "60"))
+        # HNSW 删除后的墓碑超过该比例时，在合并时重建索引
+        self.tombstone_ratio = float(os.getenv("STORE_TOMBSTONE_RATIO", "0.2"))
+        # 最近查询的向量，答案缓存查找和向量检索共用同一次编码
+        self._query_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_lock = threading.Lock()
 
         self._load()
 
+    @property
+    def model(self):
+        """Embedding模型由进程内注册表共享，第一次使用时加载（或由后台预热提前加载）"""
+        return registry.embedding_model(self.model_name)
+
+    @property
+    def embedding_available(self) -> bool:
+        """向量检索可用（模型可能仍在加载中）"""
+        return (FAISS_AVAILABLE and SENTENCE_TRANSFORMERS_AVAILABLE
+                and registry.status("embedding", self.model_name) != FAILED)
+
+    @property
+    def embedding_ready(self) -> bool:
+        """模型已加载完成；加载完成之前检索只走 BM25，不阻塞请求"""
+        return registry.is_ready("embedding", self.model_name)
+
+    @property
+    def version(self) -> int:
+        """知识库版本：每次添加、删除或替换文档后递增（即已应用的日志序号）"""
+        return self.meta.applied_seq
+
+    def encode_query(self, query: str) -> Optional[np.ndarray]:
+        """编码查询文本，返回归一化的一维向量；模型尚未就绪时返回 None"""
+        if not self.embedding_ready:
+            return None
+        with self._query_lock:
+            vector = self._query_vectors.get(query)
+            if vector is not None:
+                self._query_vectors.move_to_end(query)
+                return vector
+        vector = np.asarray(self.model.encode([query], convert_to_tensor=False, normalize_embeddings=True),
+                            dtype="float32")[0]
+        with self._query_lock:
+            self._query_vectors[query] = vector
+            if len(self._query_vectors) > 256:
+                self._query_vectors.popitem(last=False)
+        return vector
+
     def _load(self):
-        """加载元数据和FAISS索引"""
-        if os.path.exists(self.meta_path):
-            with open(self.meta_path, "r", encoding="utf-8") as f:
-                self.meta = [json.loads(line) for line in f]
+        """加载最近的索引快照，并回放快照之后已提交的增量"""
+        index_path, meta_path = self.log.snapshot_paths()
+        if not self.meta.initialized:
+            # 旧版元数据保存在 meta.jsonl 快照中，一次性导入 SQLite
+            rows = []
+            if meta_path and os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    rows = [self._with_id(json.loads(line), position) for position, line in enumerate(f)]
+            self.meta.import_rows(rows, self.log.manifest["seq"])
+            if rows:
+                print(f"✓ 已将 {len(rows)} 条块元数据导入 SQLite。")
         
-        if self.embedding_available and os.path.exists(self.index_path):
+        # 加载索引只需要 faiss，不需要等待Embedding模型
+        if FAISS_AVAILABLE and os.path.exists(index_path):
             try:
-                self.index = faiss.read_index(self.index_path)
-                print(f"✓ FAISS索引加载成功，包含 {self.index.ntotal} 个向量ảng。")
+                self.index = faiss.read_index(index_path)
+                print(f"✓ FAISS索引加载成功，包含 {self.index.ntotal} 个向量。")
             except Exception as e:
                 print(f"✗ FAISS索引加载失败: {e}")
                 self.index = None
-        
-        if self.embedding_available and self.index is None:
-            # 如果模型可用但索引不存在或加载失败，则初始化一个新索引
-            embedding_dim = self.model.get_sentence_embedding_dimension()
-            self.index = faiss.IndexFlatL2(embedding_dim)
-
-    def _save(self):
-        """保存元数据和FAISS索引"""
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            for m in self.meta:
-                f.write(json.dumps(m, ensure_ascii=False) + "\n")
-        
-        if self.embedding_available and self.index:
-            faiss.write_index(self.index, self.index_path)
+
+        replayed = 0
+        for record, vectors in self.log.replay():
+            if vectors is not None:
+                faiss.normalize_L2(vectors)
+            self._apply(record, vectors, apply_meta=record["seq"] > self.meta.applied_seq)
+            replayed += 1
+        if replayed:
+            print(f"✓ 已回放 {replayed} 个增量段。")
+
+        if self.index is not None and not (uses_cosine(self.index) and has_stable_ids(self.index)):
+            # 旧版索引（L2距离 / 以行号寻址）启动时一次性迁移为归一化向量 + 内积 + 稳定ID索引
+            self._migrate(self._pending_migration())
+            self.compact(force=True)
+
+        if self.index is not None:
+            configure_search(self.index, self.index_config)
+            # 旧索引与配置的类型不符时在后台迁移
+            self._maybe_compact()
+
+    @staticmethod
+    def _with_id(m: Dict, position: int) -> Dict:
+        """旧版元数据没有 id，以其行号(index)作为块ID"""
+        if "id" not in m:
+            m["id"] = m.pop("index", position)
+        return m
+
+    def _apply(self, record: Dict, vectors: Optional[np.ndarray], apply_meta: bool = True):
+        """将一条 journal 记录应用到元数据库和内存中的索引（写入与回放共用）"""
+        op = record["op"]
+        removed = record.get("ids", []) if op == "delete" else record.get("delete", [])
+        added = [self._with_id(m, 0) for m in record.get("meta", [])]
+
+        if apply_meta:
+            self.meta.apply(record["seq"], added, removed)
+
+        if vectors is not None and self.index is None:
+            # 索引不存在时，按第一批向量的维度和配置初始化一个新索引
+            self.index = build_index(self.index_config.desired_type(0), vectors.shape[1], self.index_config)
+        if self.index is None:
+            return
+        if removed:
+            # HNSW 不支持删除：向量作为墓碑留在索引中，检索时按元数据过滤，合并时重建
+            remove_ids(self.index, removed)
+        if vectors is not None:
+            vector_ids = record.get("vector_ids") or [m["id"] for m in added]
+            if has_stable_ids(self.index):
+                self.index.add_with_ids(vectors, np.array(vector_ids, dtype="int64"))
+            else:
+                # 旧版行号索引：旧日志中的块ID就是行号，迁移前按顺序追加
+                self.index.add(vectors)
+
+    def _pending_migration(self) -> Optional[str]:
+        if self.index is None:
+            return None
+        current = index_type_of(self.index)
+        total = self.meta.total_chunks
+        target = self.index_config.needs_migration(current, total)
+        if target is None:
+            tombstones = self.index.ntotal - total
+            rebuild = (not uses_cosine(self.index) or not has_stable_ids(self.index)
+                       or tombstones > self.index.ntotal * self.tombstone_ratio)
+            if rebuild:
+                target = self.index_config.desired_type(total) if current != "flat" else current
+        return target
+
+    def _migrate(self, target: str):
+        """重建为目标类型的索引：在锁外训练和批量写入，最后补齐迁移期间的增删再切换"""
+        with self._lock:
+            source = self.index
+            ids = self.meta.all_ids()
+            vectors = reconstruct_ids(source, ids)
+        faiss.normalize_L2(vectors)
+
+        print(f"… 正在将索引从 {index_type_of(source)} 迁移到 {target}（{len(ids)} 个向量）")
+        new_index = build_index(target, source.d, self.index_config, train_vectors=vectors)
+        new_index.add_with_ids(vectors, np.array(ids, dtype="int64"))
+
+        with self._lock:
+            if self.index is not source:
+                return
+            known = set(ids)
+            current_ids = self.meta.all_ids()
+            added = [cid for cid in current_ids if cid not in known]
+            removed = known.difference(current_ids)
+            if added:
+                tail = reconstruct_ids(source, added)
+                faiss.normalize_L2(tail)
+                new_index.add_with_ids(tail, np.array(added, dtype="int64"))
+            if removed:
+                remove_ids(new_index, list(removed))
+            self.index = new_index
+        print(f"✓ 索引已迁移到 {target}。")
+
+    def compact(self, force: bool = False) -> bool:
+        """将快照之后的增量段合并为新快照；写盘在锁外进行，不阻塞检索和写入"""
+        with self._compact_lock:
+            return self._compact(force)
+
+    def _compact(self, force: bool) -> bool:
+        target = self._pending_migration()
+        if target:
+            try:
+                self._migrate(target)
+            except Exception as e:
+                print(f"✗ 索引迁移失败: {e}")
+
+        with self._lock:
+            if self.index is None or (self.log.pending == 0 and not target and not force):
+                return False
+            seq = self.log.last_seq
+            index_copy = faiss.clone_index(self.index)
+
+        try:
+            self.log.commit_snapshot(seq, lambda path: faiss.write_index(index_copy, path))
+            print(f"✓ 向量存储已合并到快照 #{seq}。")
+            return True
+        except Exception as e:
+            print(f"✗ 向量存储合并失败: {e}")
+            return False
+
+    def _maybe_compact(self):
+        """增量段数量达到阈值时，启动后台合并线程"""
+        with self._lock:
+            if self._compacting:
+                return
+            if self.log.pending < self.compact_threshold and not self._pending_migration():
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="vector-store-compaction", daemon=True).start()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """编码文本块；按内容哈希优先读取磁盘缓存，只对未见过的文本调用模型"""
+        hashes = [content_hash(t) for t in texts]
+        vectors = self.embedding_cache.get_many(hashes)
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in vectors:
+                missing.setdefault(h, text)
+
+        if missing:
+            model = self.model
+            if model is None:
+                raise RuntimeError(f"Embedding模型 {self.model_name} 不可用")
+            embeddings = model.encode(list(missing.values()), convert_to_tensor=False,
+                                      show_progress_bar=True, normalize_embeddings=True)
+            fresh = dict(zip(missing, np.asarray(embeddings, dtype='float32')))
+            self.embedding_cache.put_many(fresh)
+            vectors.update(fresh)
+        if len(missing) < len(texts):
+            print(f"✓ Embedding缓存命中 {len(texts) - len(missing)}/{len(texts)} 个文本块。")
+
+        return np.stack([vectors[h] for h in hashes]).astype('float32')
+
+    @staticmethod
+    def _unique_chunks(chunks: List[str]) -> List[str]:
+        """去掉同一文档内内容完全相同的块"""
+        return list(dict.fromkeys(chunks))
 
     def add(self, doc_id: str, chunks: List[str]) -> int:
         """将文档块编码为向量并添加到索引中"""
         if not chunks or not self.embedding_available:
             return 0
             
+        chunks = self._unique_chunks(chunks)
         try:
             # 编码文本块
-            embeddings = self.model.encode(chunks, convert_to_tensor=False, show_progress_bar=True)
-            
-            # 添加到FAISS索引
-            self.index.add(np.array(embeddings, dtype='float32'))
+            embeddings = self._encode(chunks)
             
-            # 添加元数据
-            base_idx = len(self.meta)
-            for i, chunk in enumerate(chunks):
-                self.meta.append({
+            with self._lock:
+                next_id = self.meta.next_id
+                new_meta = [{
+                    "id": next_id + i,
                     "doc_id": doc_id,
                     "chunk_id": i,
                     "text": chunk,
-                    "index": base_idx + i
-                })
-            
-            self._save()
-            print(f"✓ 成功添加 {len(chunks)} 个文档块到向量存储ảng。")
+                    "hash": content_hash(chunk)
+                } for i, chunk in enumerate(chunks)]
+
+                # 先写入日志（提交点），再更新元数据库和内存中的索引
+                seq = self.log.append("add", embeddings, meta=new_meta)
+                self._apply({"seq": seq, "op": "add", "meta": new_meta}, embeddings)
+
+            self._maybe_compact()
+            print(f"✓ 成功添加 {len(chunks)} 个文档块到向量存储。")
             return len(chunks)
         except Exception as e:
             print(f"✗ 添加文档到向量存储时出错: {e}")
             return 0
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """对查询进行编码并执行向量搜索"""
-        if not self.embedding_available or self.index is None or self.index.ntotal == 0:
-            return []
-            
+    def delete_document(self, doc_id: str) -> int:
+        """删除一个文档的全部块，返回删除的块数"""
+        with self._write_lock, self._lock:
+            ids = [c["id"] for c in self.meta.doc_chunks(doc_id)]
+            if not ids:
+                return 0
+            seq = self.log.append("delete", ids=ids)
+            self._apply({"seq": seq, "op": "delete", "ids": ids}, None)
+
+        self._maybe_compact()
+        print(f"✓ 已从向量存储删除文档 {doc_id} 的 {len(ids)} 个块。")
+        return len(ids)
+
+    def replace_document(self, doc_id: str, chunks: List[str]) -> Dict[str, int]:
+        """用新的分块替换文档：文本未变化的块沿用原有ID和向量，只对新增或修改的块重新编码"""
+        if not self.embedding_available:
+            return {"chunks": 0, "reused": 0, "embedded": 0, "removed": 0}
+
+        with self._write_lock:
+            return self._replace_document(doc_id, self._unique_chunks(chunks))
+
+    def _replace_document(self, doc_id: str, chunks: List[str]) -> Dict[str, int]:
+        old_by_text = {}
+        for c in self.meta.doc_chunks(doc_id):
+            old_by_text.setdefault(c["text"], []).append(c["id"])
+
+        new_meta, changed = [], []
+        for i, chunk in enumerate(chunks):
+            reused = old_by_text.get(chunk)
+            if reused:
+                new_meta.append({"id": reused.pop(0), "doc_id": doc_id, "chunk_id": i, "text": chunk,
+                                 "hash": content_hash(chunk)})
+            else:
+                new_meta.append({"id": None, "doc_id": doc_id, "chunk_id": i, "text": chunk,
+                                 "hash": content_hash(chunk)})
+                changed.append(i)
+        deleted = [cid for ids in old_by_text.values() for cid in ids]
+
+        embeddings = self._encode([chunks[i] for i in changed]) if changed else None
+
+        with self._lock:
+            next_id = self.meta.next_id
+            for offset, i in enumerate(changed):
+                new_meta[i]["id"] = next_id + offset
+            vector_ids = [new_meta[i]["id"] for i in changed]
+            payload = {"doc_id": doc_id, "delete": deleted, "meta": new_meta, "vector_ids": vector_ids}
+            seq = self.log.append("replace", embeddings, **payload)
+            self._apply({"seq": seq, "op": "replace", **payload}, embeddings)
+
+        self._maybe_compact()
+        stats = {"chunks": len(chunks), "reused": len(chunks) - len(changed),
+                 "embedded": len(changed), "removed": len(deleted)}
+        print(f"✓ 已替换文档 {doc_id}: {stats}")
+        return stats
+
+    def has_document(self, doc_id: str) -> bool:
+        return self.meta.has_document(doc_id)
+
+    def list_documents(self) -> List[Dict]:
+        """列出知识库中的文档及其块数"""
+        return self.meta.list_documents()
+
+    def search(self, query: str, top_k: int = 5, min_score: Optional[float] = None,
+               nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               mode: Optional[str] = None) -> List[Dict]:
+        """检索与查询相关的文档块。
+
+        mode: dense 为向量检索，分数为余弦相似度 (-1~1)，低于 min_score 的结果会被丢弃；
+        lexical 为 BM25 关键词检索，分数为 BM25 分数；hybrid 用倒数排名融合(RRF)合并两路结果，
+        分数为 RRF 分数，只由关键词命中的块同样要求余弦相似度不低于 min_score。nprobe/ef_search 可覆盖IVF/HNSW索引的默认召回参数。
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        # 多取一些候选以补足被墓碑或重复内容过滤掉的结果
+        k = top_k * 2
+
         try:
-            # 编码查询
-            query_vector = self.model.encode([query], convert_to_tensor=False)
-            query_vector = np.array(query_vector, dtype='float32')
-            
-            # FAISS搜索
-            distances, indices = self.index.search(query_vector, top_k)
-            
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.meta):
-                    meta_info = self.meta[idx]
-                    results.append({
-                        "doc_id": meta_info["doc_id"],
-                        "chunk_id": meta_info["chunk_id"],
-                        "text": meta_info["text"],
-                        "score": 1 - distances[0][i] # 转换为相似度分数
-                    })
-            return results
+            if mode == "lexical":
+                hits = self.meta.lexical_search(query, k)
+            elif mode == "dense":
+                hits = self._dense_hits(query, k, min_score, nprobe, ef_search)
+            else:
+                dense = self._dense_hits(query, k, min_score, nprobe, ef_search)
+                lexical = self._filter_lexical(query, self.meta.lexical_search(query, k), min_score,
+                                               {cid for cid, _ in dense})
+                hits = rrf_fuse([[cid for cid, _ in dense], [cid for cid, _ in lexical]], k=self.rrf_k)
+            return self._resolve_hits(hits, top_k)
         except Exception as e:
-            print(f"✗ 向量搜索失败: {e}")
+            print(f"✗ 检索失败: {e}")
+            return []
+
+    def _dense_hits(self, query: str, k: int, min_score: Optional[float],
+                    nprobe: Optional[int], ef_search: Optional[int]) -> List[tuple]:
+        """向量检索，返回 (块ID, 余弦相似度)"""
+        if min_score is None:
+            min_score = self.min_score
+        if not self.embedding_ready or self.index is None or self.index.ntotal == 0:
+            return []
+
+        query_vector = self.encode_query(query)
+        if query_vector is None:
             return []
+        query_vector = query_vector.reshape(1, -1)
+
+        with self._lock:
+            params = search_params(self.index, nprobe=nprobe, ef_search=ef_search)
+            distances, indices = self.index.search(query_vector, k, params=params)
+        return [(int(idx), float(score)) for idx, score in zip(indices[0], distances[0])
+                if idx >= 0 and score >= min_score]
+
+    def _filter_lexical(self, query: str, hits: List[tuple], min_score: Optional[float],
+                        dense_ids: set) -> List[tuple]:
+        """丢弃与查询的余弦相似度低于 min_score 的关键词命中。
+
+        BM25 的 OR 查询几乎能匹配任何块（如只共享"什么"二字），融合后这些块的 RRF 分数
+        与真正相关的块相差无几，因此对未出现在向量结果中的块按其向量补算相似度。
+        Embedding模型不可用时无法比较，保留全部关键词结果。"""
+        if min_score is None:
+            min_score = self.min_score
+        candidates = [cid for cid, _ in hits if cid not in dense_ids]
+        if not candidates:
+            return hits
+        query_vector = self.encode_query(query)
+        if query_vector is None:
+            return hits
+        metas = self.meta.get_many(candidates)
+        hashes = {cid: m["hash"] or content_hash(m["text"]) for cid, m in metas.items()}
+        vectors = self.embedding_cache.get_many(hashes.values())
+        missing = {h: metas[cid]["text"] for cid, h in hashes.items() if h not in vectors}
+        if missing:
+            encoded = self.model.encode(list(missing.values()), convert_to_tensor=False, normalize_embeddings=True)
+            vectors.update(zip(missing, np.asarray(encoded, dtype="float32")))
+        return [(cid, score) for cid, score in hits
+                if cid in dense_ids or (cid in hashes and float(vectors[hashes[cid]] @ query_vector) >= min_score)]
+
+    def _resolve_hits(self, hits: List[tuple], top_k: int) -> List[Dict]:
+        """只读取命中块的元数据；已删除的块（墓碑）在这里被过滤"""
+        metas = self.meta.get_many([cid for cid, _ in hits])
+
+        results = []
+        seen = set()
+        for cid, score in hits:
+            meta_info = metas.get(cid)
+            if meta_info is None:
+                continue
+            # 不同文档中内容相同的块只保留得分最高的一个，避免重复占用提示词
+            key = meta_info["hash"] or meta_info["text"]
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append({
+                "id": meta_info["id"],
+                "doc_id": meta_info["doc_id"],
+                "chunk_id": meta_info["chunk_id"],
+                "text": meta_info["text"],
+                "score": score
+            })
+            if len(results) == top_k:
+                break
+        return results
 
     def get_stats(self) -> Dict:
         """获取存储统计信息"""
         return {
-            "total_chunks": len(self.meta),
-            "total_docs": len(set(m["doc_id"] for m in self.meta)),
+            "total_chunks": self.meta.total_chunks,
+            "total_docs": self.meta.total_docs,
             "storage_type": "vector_store" if self.embedding_available else "simple_text (fallback)",
             "embedding_available": self.embedding_available,
-            "index_vectors": self.index.ntotal if self.index else 0
+            "embedding_ready": self.embedding_ready,
+            "index_vectors": self.index.ntotal if self.index else 0,
+            "index_type": index_type_of(self.index) if self.index else None,
+            "pending_segments": self.log.pending
         }
+
+
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(data_dir: str) -> VectorStore:
+    """返回该数据目录在进程内共享的 VectorStore；同一目录只能有一个写入者"""
+    key = os.path.abspath(data_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = VectorStore(data_dir)
+        return store
@@ -1,113 +1,169 @@
 import os
-# 关键修复：在导入任何torch/numpy库之前，限制CPU核心使用
-# 这是防止easyocr在视频处理时导致系统崩溃的关键步骤
-os.environ['OMP_NUM_THREADS'] = '1'
-
-import cv2
-import easyocr
-import os
 import re
-from typing import List, Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import logging
 
+from .frame_sampler import FrameSampler
+from .ocr_pipeline import get_ocr_pipeline
+from .ocr_engine import get_ocr_engine
+from .ocr_cache import get_ocr_cache
+from .frame_gate import FrameChangeGate
+from .ocr_regions import FramePreprocessor, resolve_profile
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 初始化OCR读取器 (仅在首次调用时加载模型)
-# 支持中文简体和英文
-# 检查是否可以使用GPU加速
-try:
-    import torch
-    use_gpu = torch.backends.mps.is_available() and torch.backends.mps.is_built()
-    print(f"GPU acceleration available: {use_gpu}")
-except:
-    use_gpu = False
-    
-reader = easyocr.Reader(['ch_sim', 'en'], gpu=use_gpu) 
-
-def extract_text_from_video(video_path: str, interval_seconds: int = 3) -> str:
+def extract_text_from_video(video_path: str, interval_seconds: int = 3, profile: Optional[str] = None) -> str:
     """
     从视频文件中提取文本。
 
     Args:
         video_path (str): 视频文件的绝对路径。
         interval_seconds (int): 每隔多少秒提取一帧进行OCR。
+        profile (str): ROI配置名称；为空时按录像时的OBS场景、文件名匹配 ROI 配置。
 
     Returns:
-        str: 从视频中提取并合并的所有唯一文本。
+        str: 从视频中提取并合并的所有唯一文本（按出现的先后顺序）。
     """
-    if not os.path.exists(video_path):
-        logger.error(f"视频文件未找到: {video_path}")
-        return ""
+    texts = [event["text"] for event in iter_text_from_video(video_path, interval_seconds, profile)
+             if event["type"] == "text"]
+    return "\n".join(texts)
 
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        logger.error(f"无法打开视频文件: {video_path}")
-        return ""
+def iter_text_from_video(video_path: str, interval_seconds: int = 3,
+                         profile: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    边识别边返回视频中的文本，供流式分析使用。
 
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0:
-        logger.warning("无法获取视频FPS，将使用默认帧间隔。")
-        frame_interval = 25 * interval_seconds # 假设一个默认值
-    else:
-        frame_interval = int(fps * interval_seconds)
-
-    all_texts = set()
-    frame_count = 0
-
-    logger.info(f"开始处理视频: {os.path.basename(video_path)}, FPS: {fps}, 帧间隔: {frame_interval}")
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_count % frame_interval == 0:
-            try:
-                # EasyOCR需要BGR格式的图像
-                result = reader.readtext(frame, detail=0, paragraph=True)
-                
-                current_frame_text = " ".join(result)
-                if current_frame_text:
-                    all_texts.add(current_frame_text)
-                    logger.info(f"在第 {frame_count} 帧找到文本: {current_frame_text[:50]}...")
-
-            except Exception as e:
-                logger.error(f"处理第 {frame_count} 帧时发生错误: {e}")
-        
-        frame_count += 1
-
-    cap.release()
-    logger.info(f"视频处理完成。共处理 {frame_count} 帧，在 {len(all_texts)} 个关键帧上找到文本。")
-    
-    return "\n".join(sorted(list(all_texts)))
+    产生两类事件：
+    - {"type": "text", "index", "timestamp", "text"}: 一段新出现的（去重后的）帧文本，按时间顺序；
+    - {"type": "progress", "frames_scanned", "frames_ocr", "frames_skipped", "texts_found", "position", "cached"}:
+      进度，随文本一起或在等待OCR时约每0.5秒产生一次。
 
-def parse_ocr_text_to_qa(text: str) -> List[Dict[str, str]]:
-    """
-    使用正则表达式从OCR文本中稳健地提取问答对。
-    - 采用 re.finditer 查找所有问题的起点，以处理格式混乱的文本。
-    - 支持多种题号格式 (如 "1.", "1、", "一、")。
-    - 能处理问题之间没有换行符的情况。
+    完整识别的结果写入OCR缓存（见 ocr_cache.OCRCache）；命中缓存时不解码视频，
+    直接返回缓存的文本和一次 cached=True 的进度。
     """
+    if not os.path.exists(video_path):
+        logger.error(f"视频文件未找到: {video_path}")
+        return
+
+    sampler = FrameSampler()
+    # 画面与上一次OCR的帧相同时跳过OCR
+    gate = FrameChangeGate()
+    roi_profile = resolve_profile(video_path, profile)
+    preprocessor = FramePreprocessor(roi_profile)
+    sampled = 0
+    position = 0.0
+    seen = set()
+
+    def text_event(frame: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # 按时间顺序去重，保持题目在视频中出现的先后顺序
+        if frame["text"] in seen:
+            return None
+        seen.add(frame["text"])
+        logger.info(f"在第 {frame['index']} 帧 ({frame['timestamp']:.1f}s) 找到文本: {frame['text'][:50]}...")
+        return {"type": "text", "index": frame["index"], "timestamp": frame["timestamp"], "text": frame["text"]}
+
+    # 同一录像、同一OCR模型和采样/预处理参数的识别结果直接从缓存读取
+    cache = get_ocr_cache()
+    cache_key = video_hash = None
+    cache_params = {
+        "ocr_model": get_ocr_engine().model_id,
+        "interval": interval_seconds,
+        "sampler": [sampler.method, sampler.seek_min_frames],
+        "gate": [gate.enabled, gate.width, gate.pixel_threshold, gate.changed_ratio, gate.max_skip_seconds],
+        "roi": {**roi_profile, "auto_detect": preprocessor.auto_detect, "max_width": preprocessor.max_width},
+    }
+    if cache is not None:
+        try:
+            video_hash = cache.video_hash(video_path)
+            cache_key = cache.make_key(video_hash, cache_params)
+            cached = cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"读取OCR缓存失败，重新识别: {e}")
+            cache = cached = None
+        if cached is not None:
+            logger.info(f"命中OCR缓存: {os.path.basename(video_path)}，{len(cached)} 帧识别结果")
+            for frame in cached:
+                event = text_event(frame)
+                if event:
+                    yield event
+            yield {"type": "progress", "frames_scanned": 0, "frames_ocr": 0, "frames_skipped": 0,
+                   "texts_found": len(seen), "position": cached[-1]["timestamp"] if cached else 0.0,
+                   "cached": True}
+            return
+
+    def changed_frames():
+        nonlocal sampled, position
+        # 只解码采样帧，跳过的帧不做完整解码；裁剪和画面变化检测在解码线程中进行
+        for frame in sampler.frames(video_path, interval_seconds):
+            sampled += 1
+            position = frame.timestamp
+            image = preprocessor.crop_roi(frame.image)
+            if not gate.should_process(image, frame.timestamp):
+                continue
+            image = preprocessor.prepare(image)
+            if image is not None:
+                yield frame._replace(image=image)
+
+    def progress() -> Dict[str, Any]:
+        return {
+            "type": "progress",
+            "frames_scanned": sampled,
+            "frames_ocr": gate.processed - preprocessor.no_text,
+            "frames_skipped": gate.skipped + preprocessor.no_text,
+            "texts_found": len(seen),
+            "position": round(position, 1),
+            "cached": False,
+        }
+
+    logger.info(f"开始处理视频: {os.path.basename(video_path)}, 采样间隔: {interval_seconds} 秒, "
+                f"ROI配置: {preprocessor.name}")
+
+    # 所有识别出文本的帧（含重复文本），完整识别后写入缓存
+    recognized: List[Dict[str, Any]] = []
+    try:
+        for ft in get_ocr_pipeline().iter_results(changed_frames()):
+            if ft is not None:
+                frame = ft._asdict()
+                recognized.append(frame)
+                event = text_event(frame)
+                if event:
+                    yield event
+            yield progress()
+    except Exception as e:
+        logger.error(f"视频OCR失败: {e}")
+        return
+
+    logger.info(f"视频处理完成。共采样 {sampled} 帧，OCR {gate.processed - preprocessor.no_text} 帧"
+                f"（跳过 {gate.skipped} 个无变化帧、{preprocessor.no_text} 个无文字帧），"
+                f"在 {len(seen)} 个关键帧上找到文本。")
+    if cache is not None and sampled:
+        try:
+            cache.put(cache_key, video_hash, cache_params, recognized)
+        except Exception as e:
+            logger.warning(f"写入OCR缓存失败: {e}")
+    yield progress()
+
+# 一个问题块：题号 + 点/顿号 + 题目内容，直到下一个题号或字符串结尾
+# 使用非贪婪匹配 (.*?) 来捕获问题文本，前瞻断言 (?=...) 找到下一个题目的起点
+_QUESTION_BLOCK = re.compile(
+    r"((\d+|[一二三四五六七八九十]+)[\.、])"  # 匹配题号, e.g., "1.", "1、", "一、"
+    r"(.*?)"                               # 非贪婪匹配题目内容
+    r"(?=\s*(\d+|[一二三四五六七八九十]+)[\.、]|\Z)", # 匹配到下一个题号或字符串结尾
+    re.DOTALL  # DOTALL 模式让 '.' 可以匹配换行符
+)
+
+
+def _parse_blocks(text: str) -> List[Dict[str, str]]:
     qa_pairs = []
-    # 正则表达式匹配一个问题的开始：题号 + 点/顿号 + 题目内容 + 选项
-    # 使用非贪婪匹配 (.*?) 来捕获问题文本
-    # 使用前瞻断言 (?=...) 来找到下一个题目的起点或字符串的结尾
-    pattern = re.compile(
-        r"((\d+|[一二三四五六七八九十]+)[\.、])"  # 匹配题号, e.g., "1.", "1、", "一、"
-        r"(.*?)"                               # 非贪婪匹配题目内容
-        r"(?=\s*(\d+|[一二三四五六七八九十]+)[\.、]|\Z)", # 匹配到下一个题号或字符串结尾
-        re.DOTALL  # DOTALL 模式让 '.' 可以匹配换行符
-    )
-
-    for match in pattern.finditer(text):
+    for match in _QUESTION_BLOCK.finditer(text):
         full_question_block = match.group(0).strip()
-        
+
         # 提取问题和选项
         # 问题是题号之后，第一个选项之前的内容
         question_match = re.search(r"^(.*?)(?=\s*[A-Z][\.、\)])", full_question_block, re.DOTALL)
-        
+
         if question_match:
             question_text = question_match.group(1).strip()
             # 移除题号部分
@@ -115,19 +171,47 @@ def parse_ocr_text_to_qa(text: str) -> List[Dict[str, str]]:
 
             # 选项是问题之后的所有内容
             options_text = full_question_block[question_match.end():].strip()
-            
+
             if question_text:
                 qa_pairs.append({
                     "question": question_text,
                     "options": options_text
                 })
+    return qa_pairs
+
+
+def parse_ocr_text_to_qa(text: str) -> List[Dict[str, str]]:
+    """
+    使用正则表达式从OCR文本中稳健地提取问答对。
+    - 采用 re.finditer 查找所有问题的起点，以处理格式混乱的文本。
+    - 支持多种题号格式 (如 "1.", "1、", "一、")。
+    - 能处理问题之间没有换行符的情况。
+    """
+    qa_pairs = _parse_blocks(text)
 
     # 如果上面的方法没有解析出任何内容，使用备用方案：将全部文本作为一个问题
     if not qa_pairs and text.strip():
         return [{"question": text.strip(), "options": ""}]
-        
+
     return qa_pairs
 
+
+def split_complete_questions(text: str, final: bool = False) -> Tuple[List[Dict[str, str]], str]:
+    """增量解析OCR文本：返回 (已完整的问答对, 未完成的尾部文本)。
+
+    出现下一个题号后，前一题的选项才算完整；最后一个题号起的文本作为尾部，与后续帧的文本
+    拼接后再解析，每段文本只被解析常数次，长视频不会反复解析全文。没有题号的文本不会成为
+    题目的一部分，直接丢弃。final=True（视频结束）时尾部中的问题也一并返回。
+    """
+    if final:
+        return _parse_blocks(text), ""
+    last_start = None
+    for match in _QUESTION_BLOCK.finditer(text):
+        last_start = match.start()
+    if last_start is None:
+        return [], ""
+    return _parse_blocks(text[:last_start]), text[last_start:]
+
 # --- 用于直接测试该脚本 ---
 if __name__ == '__main__':
     import sys